@@ -0,0 +1,212 @@
+"""Microbenchmarks of the auction solvers on synthetic markets (no SUMO needed).
+
+Markets mimic the ones built in `auction_measurement.py`: parking lots are
+edges of a grid network named like the scenario (e.g. "A0B0"), buyers have a
+destination among the lots, betas are drawn from a mix configuration, and
+prices come from `starting_prices.json`. For each market size and solver mode
+the wall time, the peak memory and the number of rounds are written to a JSON
+file, so that the hot path can be compared between versions."""
+
+import numpy as np
+
+import argparse
+import sys
+import json
+import random
+import time
+import tracemalloc
+import platform
+import subprocess
+
+sys.path.append("auctions")
+import auction
+import array_auction
+import optimal
+from generate_demand import get_distance, ZONE_2_PRICE
+
+STARTING_PRICE_DEF = "../02_data/starting_prices.json"
+BLOCK_LENGTH = 100.0 #m, distance between neighbouring junctions
+MAX_ROWS = 10 #rows are named with a single digit
+DEFAULT_MIX = {"values": [0.1, 0.5, 0.9], "probabilities": [0.25, 0.5, 0.25]}
+BENCHMARK_MODES = ["objects", "arrays", "eps_scaling", "optimal", "multi_unit"]
+MODE_MAX_BUYERS = {"objects": 1000, "multi_unit": 1000} #larger markets take minutes per mode
+
+
+#############################################
+# Synthetic markets:
+
+def grid_edges(n_columns, n_rows):
+    """Edges of a grid network in both directions, named like the scenario"""
+    columns = [chr(ord("A")+c) for c in range(n_columns)]
+    edges = []
+    for row in range(n_rows):
+        for col in range(n_columns-1):
+            edges.append(f"{columns[col]}{row}{columns[col+1]}{row}")
+            edges.append(f"{columns[col+1]}{row}{columns[col]}{row}")
+    for column in columns:
+        for row in range(n_rows-1):
+            edges.append(f"{column}{row}{column}{row+1}")
+            edges.append(f"{column}{row+1}{column}{row}")
+    return edges
+
+def grid_size(n_lots):
+    """Smallest grid (square while possible) that has at least `n_lots` edges"""
+    n = 2
+    while n < MAX_ROWS and 4*n*(n-1) < n_lots:
+        n += 1
+    n_columns = n
+    while n_columns < 26 and 2*(n_columns-1)*n + 2*n_columns*(n-1) < n_lots:
+        n_columns += 1
+    if 2*(n_columns-1)*n + 2*n_columns*(n-1) < n_lots:
+        raise ValueError(f"{n_lots} lots do not fit on the grid")
+    return n_columns, n
+
+def synthetic_market(n_buyers, n_lots, max_capacity=5, mix_config=None,
+                     starting_prices=None, seed=42, road_graph=None):
+    """Creates the inputs of `init_auction_method` for a synthetic market
+       -------------
+       parameters:
+           - n_buyers: number of buyers,
+           - n_lots: number of parking lots (edges of the grid),
+           - max_capacity: free slots of a lot are drawn from 1..max_capacity,
+           - mix_config: dict of beta "values" and "probabilities". Default: DEFAULT_MIX,
+           - starting_prices: dict of prices per edge; missing edges get ZONE_2_PRICE,
+           - seed: seed of the generator,
+           - road_graph: if given, lots are edges of this `road_distances.RoadGraph`
+                         and distances are road distances instead of grid distances"""
+    rng = np.random.default_rng(seed)
+    if mix_config is None:
+        mix_config = DEFAULT_MIX
+    if starting_prices is None:
+        starting_prices = {}
+
+    edges = grid_edges(*grid_size(n_lots)) if road_graph is None else road_graph.edge_ids
+    lots = [edges[i] for i in np.sort(rng.choice(len(edges), size=n_lots, replace=False))]
+    capacities = {lot: int(c) for lot, c in zip(lots, rng.integers(1, max_capacity+1, size=n_lots))}
+    prices = {lot: starting_prices.get(lot, ZONE_2_PRICE) for lot in lots}
+
+    if road_graph is None:
+        distances = {l1: {l2: get_distance(l1, l2)*BLOCK_LENGTH for l2 in lots} for l1 in lots}
+    else:
+        import road_distances
+        matrix = road_distances.road_distances(road_graph, lots)
+        distances = {l1: dict(zip(lots, matrix[i])) for i, l1 in enumerate(lots)}
+    vehicle_ids = [f"veh{i}" for i in range(n_buyers)]
+    destinations = rng.choice(lots, size=n_buyers)
+    parking_mtx = {v: distances[d] for v, d in zip(vehicle_ids, destinations)}
+    beta_values = rng.choice(mix_config["values"], size=n_buyers, p=mix_config["probabilities"])
+    betas = {v: float(b) for v, b in zip(vehicle_ids, beta_values)}
+    return capacities, vehicle_ids, prices, parking_mtx, betas
+
+
+#############################################
+# Measurements:
+
+def solve(mode, market, k_nearest=None):
+    """Initializes and runs the auctions of `market` with a solver mode.
+       Returns the results and the stats of the run."""
+    capacities, vehicle_ids, prices, parking_mtx, betas = market
+    stats = {}
+    if mode in ["objects", "multi_unit"]:
+        auctions, buyers = auction.init_auction_method(capacities, vehicle_ids, prices.copy(),
+                                                       parking_mtx, betas=betas,
+                                                       multi_unit=(mode == "multi_unit"),
+                                                       k_nearest=k_nearest)
+        auction_results = auction.run_auctions(auctions, buyers, stats=stats)
+        if mode == "multi_unit":
+            auction_results = auction.expand_multi_unit_results(auction_results)
+    else:
+        slots, buyers = array_auction.init_auction_method(capacities, vehicle_ids, prices.copy(),
+                                                          parking_mtx, betas=betas,
+                                                          k_nearest=k_nearest)
+        if mode == "arrays":
+            auction_results = array_auction.run_auctions(slots, buyers, stats=stats)
+        elif mode == "eps_scaling":
+            auction_results = array_auction.run_eps_scaling(slots, buyers, stats=stats)
+        else:
+            auction_results = optimal.run_optimal(slots, buyers, stats=stats)
+    return auction_results, stats
+
+def measure(mode, market, memory=True, k_nearest=None):
+    """Wall time, peak memory (MiB, traced in a second run) and stats of a solver mode"""
+    start = time.perf_counter()
+    auction_results, stats = solve(mode, market, k_nearest)
+    record = {"wall_time": time.perf_counter()-start}
+    record.update(stats)
+    record.update(auction.price_spread(auction_results))
+    if memory:
+        tracemalloc.start()
+        solve(mode, market, k_nearest)
+        record["peak_memory"] = tracemalloc.get_traced_memory()[1]/2**20
+        tracemalloc.stop()
+    return record
+
+def revision():
+    """Git revision of the working tree (None outside of a repository)"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", help="path of the JSON results", type=str,
+                        default="auction_benchmark.json")
+    parser.add_argument("--buyers", help="numbers of buyers to sweep", type=int, nargs="+",
+                        default=[10, 100, 1000, 10000])
+    parser.add_argument("--lots", help="numbers of parking lots to sweep", type=int, nargs="+",
+                        default=[36, 120, 360])
+    parser.add_argument("--modes", help="solver modes", type=str, nargs="+",
+                        choices=BENCHMARK_MODES, default=BENCHMARK_MODES)
+    parser.add_argument("--max_capacity", help="maximum free slots of a lot", type=int, default=5)
+    parser.add_argument("--mix_config", help="path to mix configuration", type=str)
+    parser.add_argument("--repeats", help="markets (seeds) per size", type=int, default=1)
+    parser.add_argument("--seed", help="seed of the first market", type=int, default=42)
+    parser.add_argument("--net", help="net file for lots and road distances (default: grid)", type=str)
+    parser.add_argument("--k_nearest", help="buyers only bid on their k nearest lots", type=int)
+    parser.add_argument("--no_memory", help="skip the traced memory run", action="store_true")
+    parser.add_argument("--uncapped", help=f"run every mode on every size (default: skip larger markets, {MODE_MAX_BUYERS})",
+                        action="store_true")
+    args = parser.parse_args()
+
+    mix_config = None
+    if args.mix_config is not None:
+        with open(args.mix_config) as f:
+            mix_config = json.load(f)
+    with open(STARTING_PRICE_DEF) as f:
+        starting_prices = json.load(f)
+    road_graph = None
+    if args.net is not None:
+        import road_distances #needs sumolib
+        road_graph = road_distances.read_road_graph(args.net)
+
+    records = []
+    for n_lots in args.lots:
+        for n_buyers in args.buyers:
+            for r in range(args.repeats):
+                market = synthetic_market(n_buyers, n_lots, args.max_capacity, mix_config,
+                                          starting_prices, seed=args.seed+r,
+                                          road_graph=road_graph)
+                n_slots = sum(market[0].values())
+                for mode in args.modes:
+                    if not args.uncapped and n_buyers > MODE_MAX_BUYERS.get(mode, n_buyers):
+                        print(f"{mode}: {n_buyers} buyers skipped (--uncapped to run it)")
+                        continue
+                    #auctions use the global generators:
+                    np.random.seed(args.seed+r)
+                    random.seed(args.seed+r)
+                    record = {"mode": mode, "buyers": n_buyers, "lots": n_lots,
+                              "slots": n_slots, "seed": args.seed+r}
+                    record.update(measure(mode, market, memory=not args.no_memory,
+                                          k_nearest=args.k_nearest))
+                    print(f"{mode}: {n_buyers} buyers, {n_lots} lots: "
+                          f"{record['wall_time']:.3f} s, {record['rounds']} rounds")
+                    records.append(record)
+
+    with open(args.output, "w") as f:
+        json.dump({"revision": revision(), "python": platform.python_version(),
+                   "numpy": np.__version__, "mix_config": args.mix_config,
+                   "max_capacity": args.max_capacity,
+                   "k_nearest": args.k_nearest, "results": records}, f, indent=1)
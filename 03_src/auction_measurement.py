@@ -1,55 +1,41 @@
-import traci
-
 import numpy as np
-import pandas as pd
 
 import argparse
 import sys
-import os
 import json
 import re
+import time as timer
+from multiprocessing import Pool
 
 sys.path.append("auctions")
 import helper
 import auction
-
-SIM_ROOT = "../01_simulation/02_scenario/"
-SIMULATION = "../01_simulation/02_scenario/sim.sumocfg"
-SUMO_CMD = ["sumo", "-c", SIMULATION, "--no-step-log"]
-TIME_STEP = 15
-PARKING_DEFS = "../01_simulation/02_scenario/parking_areas.add.xml"
-STARTING_PRICE_DEF = "../02_data/starting_prices.json"
-
-def create_parking_mtx(veh_destinations, parking_distance_map, parking_edges):
-    answer_mtx = {}
-    for veh in veh_destinations:
-        new_row = {}
-        for p_edge in parking_edges:
-            new_row[p_edge] = parking_distance_map[veh_destinations[veh]][p_edge]
-        answer_mtx[veh] = new_row
-    return answer_mtx
-
-def calc_free_parkings(free_parkings, reservations):
-    for res in reservations:
-        free_parkings[res] = max(0, free_parkings[res] - reservations[res])
-    return free_parkings
-
-def calculate_route_distance(vehicle):
-    route = traci.vehicle.getRoute(vehicle)
-    dep_pos = traci.vehicle.getLanePosition(vehicle)
-    arr_pos = traci.lane.getLength(f"{route[-1]}_0")
-    distance = 0
-    if len(route)>1:
-        distance = traci.vehicle.getDrivingDistance(vehicle, route[1], 0)
-    for i in range(1, len(route)-1):
-        distance += traci.simulation.getDistanceRoad(route[i], 0,
-                                                     route[i+1], 0,
-                                                     isDriving=True)
-    distance += arr_pos
-    return distance
+import array_auction
+import optimal
+import runner
+import sumo_backend
+from runner import create_parking_mtx
+
+AUCTION_ENGINES = ["objects", "arrays"]
+AUCTION_SOLVERS = ["clock", "eps_scaling", "optimal"]
+ARRAY_SOLVERS = ["eps_scaling", "optimal"] #only run on the arrays engine
+DEFAULT_BETA = 0.5 #beta of every buyer without a mix configuration ("ideal" runs)
+
+def grid_districts(parking_edges, block_size):
+    """Groups the parking edges of the grid network into districts of
+       block_size x block_size junctions, by the junction the edge starts
+       from (e.g. "C2" of "C2D2")."""
+    districts = {}
+    for p_edge in parking_edges:
+        col, row = ord(p_edge[0])-ord("A"), int(p_edge[1])
+        districts[p_edge] = (col//block_size, row//block_size)
+    return districts
 
 def make_auctions(free_parkings: dict, veh_destinations: dict, parking_distance_map: dict,
-                  starting_prices: dict, parking_edges: list, beta_values, beta_probabilities):
+                  starting_prices: dict, parking_edges: list, beta_values, beta_probabilities,
+                  engine="objects", solver="clock", multi_unit=False, stats=None,
+                  districts=None, pool=None, k_nearest=None, max_distance=None,
+                  r_max=None, time_budget=None):
     
     p_mtx = create_parking_mtx(veh_destinations, parking_distance_map, parking_edges)        
     betas_ = np.random.choice(beta_values, size=len(veh_destinations), p=beta_probabilities)
@@ -61,189 +47,188 @@ def make_auctions(free_parkings: dict, veh_destinations: dict, parking_distance_
     for pa in free_parkings:
         fp_[pa.split("pa")[-1]] = free_parkings[pa]
         
-    auctions, buyers = auction.init_auction_method(fp_, veh_destinations, starting_prices,
-                                                   p_mtx, betas=beta_per_vehicle)
+    start = timer.perf_counter()
+    if engine == "objects":
+        auctions, buyers = auction.init_auction_method(fp_, veh_destinations, starting_prices,
+                                                       p_mtx, betas=beta_per_vehicle,
+                                                       multi_unit=multi_unit, districts=districts,
+                                                       k_nearest=k_nearest, max_distance=max_distance)
+    else:
+        auctions, buyers = array_auction.init_auction_method(fp_, veh_destinations, starting_prices,
+                                                             p_mtx, betas=beta_per_vehicle,
+                                                             k_nearest=k_nearest, max_distance=max_distance)
     if len(buyers)>0:
         print(f"{len(auctions)} auctions started with {len(buyers)} buyers")
-    auction_results = auction.run_auctions(auctions, buyers, r_max=100)
+    init_time = timer.perf_counter()-start
+    start = timer.perf_counter()
+    if multi_unit:
+        auction_results = auction.expand_multi_unit_results(
+            auction.run_auctions(auctions, buyers, r_max=r_max, stats=stats, pool=pool,
+                                 time_budget=time_budget))
+    elif solver == "eps_scaling":
+        auction_results = array_auction.run_eps_scaling(auctions, buyers, stats=stats, r_max=r_max,
+                                                        time_budget=time_budget)
+    elif solver == "optimal":
+        auction_results = optimal.run_optimal(auctions, buyers, stats=stats)
+    elif engine == "objects":
+        auction_results = auction.run_auctions(auctions, buyers, r_max=r_max, stats=stats, pool=pool,
+                                               time_budget=time_budget)
+    else:
+        auction_results = array_auction.run_auctions(auctions, buyers, r_max=r_max, stats=stats,
+                                                     time_budget=time_budget)
+    if stats is not None:
+        stats["init_time"] = init_time
+        stats["run_time"] = timer.perf_counter()-start
+        stats.update(auction.price_spread(auction_results))
     return auction_results
 
+def check_arguments(parser, args):
+    """Resolves the auction engine (arrays for the solvers that need it) and
+       rejects the options the engine would ignore"""
+    if args.multi_unit and args.solver != "clock":
+        parser.error("--multi_unit needs the clock solver")
+    if args.multi_unit and args.engine == "arrays":
+        parser.error("--multi_unit needs the objects engine")
+    if args.engine is None:
+        args.engine = "arrays" if args.solver in ARRAY_SOLVERS else "objects"
+    if args.engine == "objects" and args.solver in ARRAY_SOLVERS:
+        parser.error(f"--solver {args.solver} runs on the arrays engine")
+    if args.engine == "arrays" and args.district_size is not None:
+        parser.error("--district_size needs the objects engine")
+    if args.engine == "arrays" and args.processes > 1:
+        parser.error("--processes needs the objects engine")
+
+class AuctionController(runner.Controller):
+    """Assigns the vehicles drawn at departure (with probability
+       penetration/10) to parking slots with auctions whenever the scheduler
+       fires. Winners get a reservation at their slot."""
+    name = "auction"
+
+    def __init__(self, args):
+        super().__init__()
+        self.args = args
+        self.mix_config = {"values": [DEFAULT_BETA], "probabilities": [1.0]}
+        if args.mix_config is not None:
+            with open(args.mix_config) as f:
+                self.mix_config = json.load(f)
+        self.pool = Pool(args.processes) if args.processes > 1 else None
+        self.auction_outcomes = {}
+        self.auction_stats = []
+        self.auction_prices = None
+        self.districts = None
+
+    def on_departure(self, runner, veh):
+        if veh not in runner.vehicle_data: #through vehicle
+            return
+        runner.vehicle_data[veh]["occupied_reserved"] = False
+        r_int = np.random.randint(0, 10)
+        if r_int<self.args.penetration:
+            self.enqueue(veh, runner.time)
+
+    def assign(self, runner, time, free_parkings):
+        args = self.args
+        if self.auction_prices is None:
+            self.auction_prices = runner.starting_prices.copy()
+            if args.district_size is not None:
+                self.districts = grid_districts(runner.parking_edges, args.district_size)
+        dests = {}
+        for veh in self.take_queue():
+            dests[veh] = runner.vehicle_data[veh]["original_position"]
+
+        if args.warm_start_decay is not None:
+            self.auction_prices = auction.warm_start_prices(runner.starting_prices, self.auction_prices,
+                                                            args.warm_start_decay)
+        if len(dests) == 0:
+            return
+        tick_stats = {"time": time, "buyers": len(dests)}
+        auction_result = make_auctions(free_parkings, dests, runner.parking_distance_map,
+                                       self.auction_prices.copy(), runner.parking_edges,
+                                       self.mix_config["values"],
+                                       self.mix_config["probabilities"],
+                                       engine=args.engine, solver=args.solver,
+                                       multi_unit=args.multi_unit, stats=tick_stats,
+                                       districts=self.districts, pool=self.pool,
+                                       k_nearest=args.k_nearest,
+                                       max_distance=args.max_distance,
+                                       r_max=args.r_max, time_budget=args.time_budget)
+        print(f"{time}: auctions {tick_stats['stopped']} after {tick_stats['rounds']} rounds, "
+              f"{tick_stats['bids']} bids, {tick_stats['run_time']:.3f} s")
+        self.auction_stats.append(tick_stats)
+        if args.warm_start_decay is not None:
+            self.auction_prices.update(auction.clearing_prices(auction_result, self.auction_prices))
+
+        for ar in auction_result:
+            veh = auction_result[ar]["winner"]
+            if veh!="":
+                print(ar, auction_result[ar])
+                new_dest = re.sub("_[0-9]*$", "", ar)
+                self.auction_outcomes[veh] = {
+                    "parking_edge": new_dest,
+                    "auction_id": ar,
+                    "price": auction_result[ar]["price"],
+                    "vehicle": veh,
+                    "distance": runner.parking_distance_map[dests[veh]][new_dest.split("pa")[-1]],
+                    "time": time
+                }
+                runner.reroute(veh, new_dest, reserve=True)
+
+    def on_stop(self, runner, veh, parking_edge):
+        data = runner.vehicle_data[veh]
+        if veh in runner.controlled_vehicles:
+            reserved_edge = self.auction_outcomes[veh]["parking_edge"]
+            runner.reservations[f"pa{reserved_edge}"] -= 1
+            data["auction_price"] = self.auction_outcomes[veh]["price"]
+            if reserved_edge == parking_edge:
+                data["paid_price"] = self.auction_outcomes[veh]["price"] #if controlled and successfully reserved
+                data["occupied_reserved"] = True
+
+    def run_info(self):
+        return {"penetration": self.args.penetration, "mix_config": self.args.mix_config,
+                "engine": self.args.engine, "solver": self.args.solver,
+                "multi_unit": self.args.multi_unit}
+
+    def finish(self, runner):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+        auction_stats = {"seed": runner.seed, "backend": runner.traci.__name__,
+                         "steps": runner.steps, "loop_time": runner.loop_time,
+                         "ticks": self.auction_stats}
+        auction_stats.update(self.run_info())
+        return {"auction_results": self.auction_outcomes,
+                "auction_stats.json": auction_stats}
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("seed", help="seed", type=str)
     parser.add_argument("--penetration", help="penetration level", type=int, default=10)
     parser.add_argument("--name", help="name of the simulation", type=str)
     parser.add_argument("--mix_config", help="path to mix configuration", type=str)
+    parser.add_argument("--engine", help="auction implementation (default: arrays for the eps_scaling and optimal solvers, objects otherwise)", type=str,
+                        choices=AUCTION_ENGINES, default=None)
+    parser.add_argument("--solver", help="auction algorithm (eps_scaling and optimal run on the arrays engine)",
+                        type=str, choices=AUCTION_SOLVERS, default="clock")
+    parser.add_argument("--multi_unit", help="one uniform-price auction per parking area (objects engine, clock solver)",
+                        action="store_true")
+    parser.add_argument("--warm_start_decay", help="seed auctions with the previous clearing prices, decaying toward the starting prices by this share per tick",
+                        type=float, default=None)
+    parser.add_argument("--district_size", help="split the auctions into districts of NxN junctions (objects engine)",
+                        type=int, default=None)
+    parser.add_argument("--k_nearest", help="buyers only bid on their k nearest parking areas",
+                        type=int, default=None)
+    parser.add_argument("--max_distance", help="buyers only bid on the parking areas within this distance (m)",
+                        type=float, default=None)
+    parser.add_argument("--r_max", help="stop the auctions after this many rounds (anytime mode)",
+                        type=int, default=None)
+    parser.add_argument("--time_budget", help="stop the auctions after this many seconds (anytime mode)",
+                        type=float, default=None)
+    parser.add_argument("--processes", help="solve independent sub-markets on a pool of this many processes (objects engine)",
+                        type=int, default=1)
+    runner.add_runner_arguments(parser)
     
     args = parser.parse_args()
-    seed = args.seed
+    check_arguments(parser, args)
     
-    parking_df = pd.read_xml(PARKING_DEFS, xpath="parkingArea").set_index("id")
-    with open(STARTING_PRICE_DEF) as f:
-        starting_prices = json.load(f)
-        
-    if not os.path.exists(f"../02_data/{args.name}"):
-        os.makedirs(f"../02_data/{args.name}")
-        
-    sim_name = args.name.split("/")[-1]
-    sumo_cmd = SUMO_CMD + ["--seed", seed, "--output-prefix",
-                           f"{sim_name}",
-                           "--tripinfo-output", f"vehicle_trips.xml"]
-    mix_config = None
-    if args.mix_config is not None:
-        with open(args.mix_config) as f:
-            mix_config = json.load(f)
-            
-    traci.start(sumo_cmd)
-    
-    #initialization:
-    parking_distance_map = {}
-    parking_edges = []
-
-    for i,r in parking_df.iterrows():
-        parking_edges.append(r.lane.split("_")[0])
-
-    for p_i in parking_edges:
-        parking_distance_map[p_i] = {}
-        for p_j in parking_edges:
-            parking_distance_map[p_i][p_j] = traci.simulation.getDistanceRoad(p_i, 0, p_j, 0, True)
-        
-        
-    controlled_vehicles = set()
-    to_auction = set()
-    active_vehicles = set()
-    vehicle_data = {}
-
-    auction_outcomes = {}
-    free_parkings = {}
-
-    reservations = {}
-    for pid in parking_df.index:
-        reservations[pid] = 0
-
-    p_ids, p_times, p_occups = [],[],[]
-
-    #Main simulation loop:
-    while traci.simulation.getMinExpectedNumber()>0:
-        time = traci.simulation.getTime()
-
-        #with lower frequency:
-        if time%TIME_STEP == 0:  
-            #parking occupancies:
-            for parking_area in parking_df.index:
-                occup = traci.parkingarea.getVehicleCount(parking_area)
-                p_ids.append(parking_area)
-                p_times.append(time)
-                p_occups.append(occup/parking_df["roadsideCapacity"][parking_area])
-                free_parkings[parking_area] = parking_df["roadsideCapacity"][parking_area] - occup
-
-            #auctions:
-            dests = {}
-            for veh in to_auction:
-                dests[veh] = vehicle_data[veh]["original_position"]
-            free_parkings = calc_free_parkings(free_parkings, reservations)
-            
-            if len(dests)>0:
-                auction_result = make_auctions(free_parkings, dests, parking_distance_map,
-                                               starting_prices.copy(), parking_edges,
-                                               mix_config["values"],
-                                               mix_config["probabilities"])
-                
-                for ar in auction_result:
-                    veh = auction_result[ar]["winner"]
-                    if veh!="":
-                        print(ar, auction_result[ar])
-                        controlled_vehicles.add(veh)
-                        #print(controlled_vehicles)
-                        new_dest = re.sub("_[0-9]*$", "", ar)
-                        auction_outcomes[veh] = {
-                            "parking_edge": new_dest,
-                            "auction_id": ar,
-                            "price": auction_result[ar]["price"],
-                            "vehicle": veh,
-                            "distance": traci.simulation.getDistanceRoad(
-                                                            dests[veh], 0,
-                                                            new_dest.split("pa")[-1], 0, True),
-                            "time": time
-                        }
-                        vehicle_data[veh]["controlled"] = True
-                        #flag 65: parking @ a parking area
-                        try:
-                            next_stop = traci.vehicle.getStops(veh, 1)[0]
-                            traci.vehicle.replaceStop(veh, 0, f"pa{new_dest}", flags=65, duration=next_stop.duration)
-                            reservations[f"pa{new_dest}"] += 1
-                        except Exception as e:
-                            print(e)
-                            if auction_result[ar]["winner"] != "":
-                                controlled_vehicles.remove(auction_result[ar]["winner"])
-            to_auction = set()
-
-        #departing vehicles:
-        departed_vehicles = traci.simulation.getDepartedIDList()
-        for dpv in departed_vehicles:
-            next_stop = traci.vehicle.getStops(dpv)
-            if len(next_stop)>0: #not through vehicle
-                pos = next_stop[0].stoppingPlaceID.split("pa")[-1]
-                vehicle_data[dpv] = {
-                    "original_position": pos,
-                    "controlled": False,
-                    "occupied_reserved": False
-                }
-            r_int = np.random.randint(0, 10)
-            if r_int<args.penetration:
-                to_auction.add(dpv)
-            active_vehicles.add(dpv)
-            
-        #parkEndingVehicles:
-        park_ends = traci.simulation.getParkingEndingVehiclesIDList()
-
-        #stopping vehicles:
-        stopping_vehicles = traci.simulation.getStopStartingVehiclesIDList()
-        #if len(stopping_vehicles)>0:
-        #    print("stopping", stopping_vehicles)
-        #if len(controlled_vehicles)>0:
-        #    print("controlled", controlled_vehicles)
-        for spv in stopping_vehicles:
-            stop_stat = traci.vehicle.getNextStops(spv)[0]
-            parking_edge = stop_stat[0].split("_")[0]
-            parking_driving_distance = traci.simulation.getDistanceRoad(
-                                                    vehicle_data[spv]["original_position"], 0,
-                                                    parking_edge, 0, True)
-            vehicle_data[spv]["parking_distance"] = parking_driving_distance
-            vehicle_data[spv]["original_price"] = starting_prices[vehicle_data[spv]["original_position"]]
-            vehicle_data[spv]["parking_price"] = starting_prices[parking_edge] 
-            vehicle_data[spv]["paid_price"] = starting_prices[parking_edge] #for uncontrolled or occupied
-            if spv in controlled_vehicles:
-                reserved_edge = auction_outcomes[spv]["parking_edge"]
-                reservations[f"pa{reserved_edge}"] -= 1
-                vehicle_data[spv]["auction_price"] = auction_outcomes[spv]["price"]
-                #print(reserved_edge, parking_edge)
-                if reserved_edge == parking_edge:
-                    vehicle_data[spv]["paid_price"] = auction_outcomes[spv]["price"] #if controlled and successfully reserved
-                    vehicle_data[spv]["occupied_reserved"] = True
-        active_vehicles = active_vehicles - set(stopping_vehicles)     
-
-        traci.simulation.step()
-                
-    traci.close()            
-    
-    occupancy_results = pd.DataFrame()
-    occupancy_results["parking_id"] = p_ids
-    occupancy_results["time"] = p_times
-    occupancy_results["occupancy"] = p_occups
-    
-    try:
-        
-        os.replace(f"{SIM_ROOT}/{sim_name}detector_data.out.xml",
-                   f"../02_data/{args.name}/detector_data.out.xml")
-        os.replace(f"./{sim_name}vehicle_trips.xml",
-                   f"../02_data/{args.name}/vehicle_trips.xml")
-        
-        with open(f"../02_data/{args.name}/veh_results.json", "w") as f:
-            json.dump(vehicle_data, f)
-        with open(f"../02_data/{args.name}/auction_results.json", "w") as f:
-            json.dump(auction_outcomes, f)
-            
-        occupancy_results.to_csv(f"../02_data/{args.name}/occupancy.csv", index=False)
-    except Exception as e:
-        print(e)
\ No newline at end of file
+    traci, backend = sumo_backend.select_backend(args.backend)
+    runner.make_runner(traci, args).run(AuctionController(args))
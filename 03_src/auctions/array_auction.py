@@ -0,0 +1,453 @@
+"""Array-backed implementation of the ascending auction in `auction.py`.
+
+Slots and buyers are stored as NumPy arrays instead of one Python object per
+participant. `init_auction_method` and `run_auctions` take the same inputs and
+return the same `{auction_id: {"winner", "price"}}` results as their
+counterparts in `auction.py`, so the two modules can be swapped."""
+
+import numpy as np
+
+import time
+
+OVERBID = 0
+WINNING = 1
+OUT_OF_BUDGET = 2
+
+MIN_BETA = 1e-6 #price weight used instead of 0 when converting costs to money
+OUTSIDE_MARGIN = 1.0 #cost of staying without a slot above the costliest feasible slot (eps_scaling)
+
+
+def _area_edge(area):
+    """Returns the edge of a parking area (same rule as `auction.Areas`)"""
+    if "garage" in area:
+        return area.split("_")[1]
+    return area.split("pa")[-1]
+
+
+############################################
+# Participants:
+class Slots:
+    """Roadside slots (auctions) of a market."""
+    def __init__(self, slot_ids, slot_area, area_ids, prices, epsilon):
+        self.ids = slot_ids
+        self.area = slot_area
+        self.area_ids = area_ids
+        self.price = prices
+        self.starting_price = prices.copy()
+        self.epsilon = epsilon
+        self.winner = np.full(len(slot_ids), -1, dtype=int)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class Buyers:
+    """Buyers of a market together with their buyer x area distance term
+       of the cost function."""
+    def __init__(self, buyer_ids, betas, pv, pvmax, distance_costs):
+        self.ids = buyer_ids
+        self.beta = betas
+        self.pv = pv
+        self.pvmax = pvmax
+        self.distance_costs = distance_costs
+        self.state = np.full(len(buyer_ids), OVERBID, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+#############################################
+# Costs:
+
+def candidate_pairs(slots, buyers, by_slot=False):
+    """Buyer x slot pairs of the market: each buyer with the slots of the
+       areas that have a finite distance cost for it. Returns the buyer and
+       slot of each pair, sorted by buyer then slot (by slot then buyer if
+       `by_slot`)."""
+    finite = np.isfinite(buyers.distance_costs)
+    if finite.all():
+        #full market, no sorting needed:
+        n_buyers, n_slots = len(buyers), len(slots)
+        if by_slot:
+            return np.tile(np.arange(n_buyers), n_slots), np.repeat(np.arange(n_slots), n_buyers)
+        return np.repeat(np.arange(n_buyers), n_slots), np.tile(np.arange(n_slots), n_buyers)
+    n_areas = len(slots.area_ids)
+    area_slots = np.argsort(slots.area, kind="stable")
+    area_size = np.bincount(slots.area, minlength=n_areas)
+    buyer, area = np.nonzero(finite)
+    buyer = np.repeat(buyer, area_size[area])
+    slot = area_slots[_ranges(np.cumsum(area_size)[area] - area_size[area], area_size[area])]
+    if by_slot:
+        return np.divmod(np.sort(slot*len(buyers) + buyer), len(buyers))[::-1]
+    return np.divmod(np.sort(buyer*len(slots) + slot), len(slots))
+
+
+class Candidates:
+    """Candidate slots of each buyer (see `candidate_pairs`), stored per
+       buyer instead of as a buyer x slot matrix. Row `i` of `slot` lists the
+       candidate slots of buyer `i` in ascending order, padded with -1 to the
+       longest list; `distance_cost` holds the distance term of the cost of
+       each (infinity for the padding). In a full market the rows list all
+       slots; in a restricted one (k_nearest, max_distance) they are as long
+       as the largest candidate set."""
+    def __init__(self, slots, buyers):
+        buyer, slot = candidate_pairs(slots, buyers)
+        self.slot, self.distance_cost = _padded(buyer, slot,
+                                                buyers.distance_costs[buyer, slots.area[slot]],
+                                                len(buyers))
+        self.lengths = np.bincount(buyer, minlength=len(buyers))
+        self.slot_buyers = np.bincount(slot, minlength=len(slots))
+
+
+def _ranges(starts, lengths):
+    """Concatenated ranges starts[k] .. starts[k]+lengths[k]"""
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+def _padded(rows, cols, values, n_rows):
+    """Lays out the entries (rows, cols, values), sorted by row then column,
+       as n_rows x (longest row) arrays of columns and values. Missing entries
+       have column -1 and value infinity."""
+    lengths = np.bincount(rows, minlength=n_rows)
+    position = np.arange(len(rows)) - (np.cumsum(lengths) - lengths)[rows]
+    padded_cols = np.full((n_rows, lengths.max(initial=0)), -1, dtype=int)
+    padded_cols[rows, position] = cols
+    padded_values = np.full(padded_cols.shape, np.inf)
+    padded_values[rows, position] = values
+    return padded_cols, padded_values
+
+
+def slot_costs(slots, buyers, candidates, rows):
+    """Computes the costs of the candidate slots of the buyers `rows` (laid
+       out as `candidates.slot[rows]`). Slots above the private value of a
+       buyer cost infinity."""
+    slot = candidates.slot[rows]
+    prices = slots.price[slot]
+    costs = buyers.beta[rows, None]*prices/buyers.pvmax + candidates.distance_cost[rows]
+    costs[prices > buyers.pv[rows, None]] = np.inf
+    return costs
+
+
+#############################################
+# Running auctions:
+
+def _collect_bids(costs, cand_slots, active, n_slots):
+    """Selects one slot for each active buyer among its cheapest ones
+       (`costs` of the candidate slots `cand_slots` of the active buyers).
+       Buyers are served in order; a buyer whose cheapest slots are all taken
+       by earlier buyers of the batch waits for the next round."""
+    best = costs.min(axis=1)
+    prefs = costs == best[:, None]
+    taken = np.zeros(n_slots, dtype=bool)
+    bidders, bid_slots = [], []
+    for row, b in enumerate(active):
+        candidates = cand_slots[row][prefs[row]]
+        candidates = candidates[~taken[candidates]]
+        if len(candidates) > 0:
+            taken[candidates[0]] = True
+            bidders.append(b)
+            bid_slots.append(candidates[0])
+    return np.array(bidders, dtype=int), np.array(bid_slots, dtype=int)
+
+
+def _budget_left(counters, r_max, deadline):
+    """Checks the round and time budgets of an anytime run, recording in
+       `counters` which one ran out"""
+    if (r_max is not None) and (counters["rounds"] >= r_max):
+        counters["stopped"] = "r_max"
+    elif (deadline is not None) and (time.perf_counter() > deadline):
+        counters["stopped"] = "deadline"
+    return counters["stopped"] == "converged"
+
+
+def run_auctions(slots, buyers, r_max=None, stats=None, time_budget=None):
+    """Runs the ascending auction until no buyer is able to bid, or until
+       `r_max` rounds or `time_budget` seconds are used up (the current
+       winners keep their slots, as in `auction.run_auctions`).
+       Within a round, every overbid buyer bids for one of its cheapest slots
+       at once; each bid outbids the previous winner and raises the price of
+       the slot by `epsilon`. Only the costs of the candidate slots of the
+       overbid buyers are computed (see `Candidates`).
+       -------------
+       parameters:
+           - slots, buyers: the market created by `init_auction_method`,
+           - r_max: maximum number of rounds (None: no limit),
+           - stats: if a dict is given, the counters of the run are stored in
+                    it (as in `auction.run_auctions`; "inform_price" counts the
+                    buyer x slot pairs whose price changed, "compute_costs"
+                    the buyer cost rows scanned),
+           - time_budget: wall-clock limit in seconds (None: no limit)"""
+    deadline = None if time_budget is None else time.perf_counter()+time_budget
+    counters = {"rounds": 0, "bids": 0, "inform_price": 0, "compute_costs": 0,
+                "stopped": "converged"}
+    if len(slots.ids) == 0:
+        #no free slots: nobody can win anything
+        buyers.state[:] = OUT_OF_BUDGET
+        if stats is not None:
+            stats.update(counters)
+        return {}
+    candidates = Candidates(slots, buyers)
+    buyers.state[candidates.lengths == 0] = OUT_OF_BUDGET
+
+    while True:
+        active = np.flatnonzero(buyers.state == OVERBID)
+        if len(active) == 0:
+            break
+        costs = slot_costs(slots, buyers, candidates, active)
+        no_budget = ~np.isfinite(costs.min(axis=1))
+        buyers.state[active[no_budget]] = OUT_OF_BUDGET
+        active, costs = active[~no_budget], costs[~no_budget]
+        if (len(active) == 0) or not _budget_left(counters, r_max, deadline):
+            break
+
+        bidders, bid_slots = _collect_bids(costs, candidates.slot[active], active, len(slots))
+        counters["rounds"] += 1
+        counters["compute_costs"] += len(active)
+        counters["bids"] += len(bidders)
+        overbid = slots.winner[bid_slots]
+        buyers.state[overbid[overbid >= 0]] = OVERBID
+        buyers.state[bidders] = WINNING
+        slots.winner[bid_slots] = bidders
+        slots.price[bid_slots] += slots.epsilon
+        counters["inform_price"] += int(candidates.slot_buyers[bid_slots].sum())
+
+    if stats is not None:
+        stats.update(counters)
+    auction_results = {}
+    for s, slot_id in enumerate(slots.ids):
+        winner = slots.winner[s]
+        auction_results[slot_id] = {
+            "winner": buyers.ids[winner] if winner >= 0 else "",
+            "price": slots.price[s]-slots.epsilon
+        }
+    return auction_results
+
+
+def _money_costs(buyers):
+    """Distance part of the cost function in money units: dividing the cost of
+       a buyer by `beta/pvmax` does not change its preferences, and makes the
+       cost of a slot `price + distance cost`."""
+    return buyers.pvmax*buyers.distance_costs/np.maximum(buyers.beta, MIN_BETA)[:, None]
+
+
+def _release_violators(cols, costs, prices, assigned, owner, eps):
+    """Resets unassigned objects to price 0, and unassigns the persons whose
+       object is not within `eps` of their cheapest option (an object or
+       staying unassigned, which costs 0). Person `i` can take the objects
+       `cols[i]` (-1: none) at `costs[i]` plus their price. Repeated until no
+       person is released, so each phase starts with unassigned objects at
+       their minimal price (needed for optimality when there are more objects
+       than persons)."""
+    while True:
+        prices[owner < 0] = 0.0
+        holders = np.flatnonzero(assigned >= 0)
+        if len(holders) == 0:
+            return
+        totals = costs[holders] + prices[cols[holders]]
+        own = totals[cols[holders] == assigned[holders][:, None]]
+        released = own > np.minimum(totals.min(axis=1), 0.0) + eps
+        if not released.any():
+            return
+        owner[assigned[holders[released]]] = -1
+        assigned[holders[released]] = -1
+
+
+def _forward_auction(cols, costs, prices, assigned, owner, left_out, eps, counters,
+                     r_max=None, deadline=None):
+    """One phase of the forward auction (Jacobi variant) with a fixed `eps`:
+       unassigned persons bid for their cheapest object (see
+       `_release_violators`). A person whose cheapest object costs at least 0
+       stays unassigned (`left_out`) for the rest of the phase; persons
+       without objects must be left out from the start. Returns early if a
+       budget runs out (see `_budget_left`)."""
+    while True:
+        free = np.flatnonzero((assigned < 0) & ~left_out)
+        if (len(free) == 0) or not _budget_left(counters, r_max, deadline):
+            return
+        counters["rounds"] += 1
+        counters["compute_costs"] += len(free)
+        totals = costs[free] + prices[cols[free]]
+        rows = np.arange(len(free))
+        best_k = totals.argmin(axis=1)
+        best, best_total = cols[free, best_k], totals[rows, best_k]
+        totals[rows, best_k] = np.inf
+        second_total = np.minimum(totals.min(axis=1), 0.0)
+        no_object = best_total >= 0.0
+        left_out[free[no_object]] = True
+        free, best = free[~no_object], best[~no_object]
+        best_total, second_total = best_total[~no_object], second_total[~no_object]
+        if len(free) == 0:
+            return
+
+        bids = prices[best] + (second_total - best_total) + eps
+
+        #highest bid wins each object, ties are won by the first person:
+        order = np.lexsort((free, -bids, best))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = best[order][1:] != best[order][:-1]
+        won = order[first]
+        won_objects, winners = best[won], free[won]
+        counters["bids"] += len(won)
+        overbid = owner[won_objects]
+        assigned[overbid[overbid >= 0]] = -1
+        owner[won_objects] = winners
+        assigned[winners] = won_objects
+        prices[won_objects] = bids[won]
+
+
+def run_eps_scaling(slots, buyers, scaling=4.0, eps_start=None, stats=None, r_max=None,
+                    time_budget=None):
+    """Solves the market with the auction algorithm of Bertsekas using
+       epsilon-scaling. Buyers minimize the same cost as in the ascending
+       auction, expressed in money units; as in `optimal.run_optimal`, slots
+       whose starting price is above the private value of a buyer are
+       infeasible for it, and staying without a slot costs an outside option
+       above the cost of every feasible slot. The smaller side of the market
+       bids: buyers bid for slots (forward auction), or, if buyers outnumber
+       slots, slots bid for buyers (reverse auction). The last phase uses
+       `epsilon` of the slots; the assignment is then within
+       min(len(buyers), len(slots))*epsilon of the least total cost. In full
+       markets this fills as many slots as `optimal.run_optimal`; in restricted
+       markets (k_nearest, max_distance) a buyer may be left out where seating
+       it would need costlier reassignments of the others.
+       A slot is sold at its starting price plus the margin of its winner over
+       the next best option (less `epsilon`, as in the ascending auction),
+       capped at the private value of the winner. If `r_max` rounds or
+       `time_budget` seconds are used up, the current assignment is returned.
+       -------------
+       parameters:
+           - slots, buyers: the market created by `init_auction_method`,
+           - scaling: factor by which eps is decreased between phases,
+           - eps_start: eps of the first phase. Default: cost range/scaling,
+           - stats: if a dict is given, the counters of the run are stored in
+                    it (as in `run_auctions`), together with the number of
+                    phases"""
+    deadline = None if time_budget is None else time.perf_counter()+time_budget
+    eps_final = slots.epsilon
+    counters = {"rounds": 0, "bids": 0, "inform_price": 0, "compute_costs": 0, "phases": 0,
+                "stopped": "converged"}
+    if len(slots.ids) == 0:
+        #no free slots: nobody can win anything
+        buyers.state[:] = OUT_OF_BUDGET
+        if stats is not None:
+            stats.update(counters)
+        return {}
+
+    #costs of the candidate pairs relative to the outside option:
+    reverse = len(buyers) > len(slots)
+    buyer, slot = candidate_pairs(slots, buyers, by_slot=reverse)
+    reserve = slots.price.copy()
+    costs = reserve[slot] + _money_costs(buyers)[buyer, slots.area[slot]]
+    costs[reserve[slot] > buyers.pv[buyer]] = np.inf
+    feasible = costs[np.isfinite(costs)]
+    outside = feasible.max(initial=0.0) + OUTSIDE_MARGIN
+    costs -= outside
+    if eps_start is None:
+        eps_start = (outside - feasible.min(initial=outside))/scaling
+    eps = max(eps_final, eps_start)
+
+    #the smaller side of the market bids:
+    if reverse:
+        cols, costs = _padded(slot, buyer, costs, len(slots))
+        n_objects = len(buyers)
+    else:
+        cols, costs = _padded(buyer, slot, costs, len(buyers))
+        n_objects = len(slots)
+    prices = np.zeros(n_objects)
+    assigned = np.full(len(cols), -1, dtype=int)
+    owner = np.full(n_objects, -1, dtype=int)
+    while True:
+        _release_violators(cols, costs, prices, assigned, owner, eps)
+        left_out = (cols < 0).all(axis=1)
+        _forward_auction(cols, costs, prices, assigned, owner, left_out, eps, counters,
+                         r_max, deadline)
+        counters["phases"] += 1
+        if (eps <= eps_final) or (counters["stopped"] != "converged"):
+            break
+        eps = max(eps_final, eps/scaling)
+
+    if reverse:
+        winner = assigned
+        sold = np.flatnonzero(winner >= 0)
+        margin = np.zeros(len(slots))
+        own_costs = costs[sold][cols[sold] == winner[sold][:, None]]
+        margin[sold] = -(own_costs + prices[winner[sold]])
+    else:
+        winner = owner
+        margin = prices - eps_final
+    if stats is not None:
+        stats.update(counters)
+    buyers.state[winner[winner >= 0]] = WINNING
+    if counters["stopped"] == "converged":
+        buyers.state[buyers.state != WINNING] = OUT_OF_BUDGET
+    slots.winner = winner
+    auction_results = {}
+    for s, slot_id in enumerate(slots.ids):
+        if winner[s] >= 0:
+            slots.price[s] = min(reserve[s] + max(margin[s], 0.0), buyers.pv[winner[s]])
+            auction_results[slot_id] = {"winner": buyers.ids[winner[s]], "price": slots.price[s]}
+        else:
+            auction_results[slot_id] = {"winner": "", "price": slots.price[s]-eps_final}
+    return auction_results
+
+
+def candidate_mask(distances, k_nearest=None, max_distance=None):
+    """Buyer x area mask of the parking areas each buyer takes part in (see
+       `auction.candidate_areas`)"""
+    mask = np.ones(distances.shape, dtype=bool)
+    if max_distance is not None:
+        mask &= distances <= max_distance
+    if (k_nearest is not None) and (k_nearest < distances.shape[1]):
+        masked = np.where(mask, distances, np.inf)
+        nearest = np.argpartition(masked, k_nearest-1, axis=1)[:, :k_nearest]
+        in_nearest = np.zeros(distances.shape, dtype=bool)
+        np.put_along_axis(in_nearest, nearest, True, axis=1)
+        mask &= in_nearest
+    return mask
+
+
+def init_auction_method(parking_capacities, vehicle_ids, starting_prices, parking_mtx, betas=None, bid_step = 0.05, max_price = 5, k_nearest = None, max_distance = None)-> (Slots, Buyers):
+    """Initializes the participants of the auction method
+       -------------
+       parameters:
+           - parking_capacities: capacity values of the parking lots (number of auctions),
+           - vehicle_ids: IDs of vehicles (buyers),
+           - starting_prices: dict of starting prices of the auctions,
+           - parking_mtx: mtx of parking distances for each vehicle
+           - betas: either a dict of vehicle_ids, betas, a float, or None. Default: 0.1
+           - bid_step: amount of money by which current bids will be increased during auctions,
+           - max_price: maximum price that the buyers are willing to accept,
+           - k_nearest, max_distance: if given, the other parking areas cost
+                                      infinity for a buyer (see `candidate_mask`)"""
+
+    if betas is None:
+        betas = 0.1
+    buyer_ids = list(vehicle_ids)
+    if type(betas) is float:
+        beta_arr = np.full(len(buyer_ids), betas)
+    else:
+        beta_arr = np.array([betas[b_i] for b_i in buyer_ids], dtype=float)
+
+    area_ids = [a for a in parking_capacities if parking_capacities[a] > 0]
+    area_edges = [_area_edge(a) for a in area_ids]
+    slot_ids, slot_area, prices = [], [], []
+    for j, a in enumerate(area_ids):
+        for i in range(parking_capacities[a]):
+            slot_ids.append(f"{a}_{i}")
+            slot_area.append(j)
+            prices.append(starting_prices[a])
+    order = np.random.permutation(len(slot_ids))
+    slots = Slots([slot_ids[i] for i in order], np.array(slot_area, dtype=int)[order],
+                  area_ids, np.array(prices, dtype=float)[order], bid_step)
+
+    distances = np.array([[parking_mtx[b_i][e] for e in area_edges] for b_i in buyer_ids],
+                         dtype=float).reshape(len(buyer_ids), len(area_edges))
+    max_distances = distances.max(axis=1, initial=0.0)
+    max_distances[max_distances == 0] = 1.0 #all areas at the buyer's position: no distance cost
+    distance_costs = (1-beta_arr)[:, None]*distances/max_distances[:, None]
+    if (k_nearest is not None) or (max_distance is not None):
+        distance_costs[~candidate_mask(distances, k_nearest, max_distance)] = np.inf
+    buyers = Buyers(buyer_ids, beta_arr, np.full(len(buyer_ids), float(max_price)),
+                    max_price, distance_costs)
+    return slots, buyers
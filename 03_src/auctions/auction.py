@@ -1,92 +1,243 @@
 import numpy as np
 
+import heapq
 import random
 import re
-
-from multiprocessing import Lock, Pool, Manager
+import time
 
 
+############################################
+# Shared index of the parking areas:
+class Areas:
+    """Parking areas of a market. Auctions refer to their area by an integer
+       index into this shared registry, so buyers can look up distances per
+       area instead of parsing the slot IDs."""
+    __slots__ = ("ids", "edges", "index")
+    
+    def __init__(self, area_ids=()):
+        self.ids = []
+        self.edges = []
+        self.index = {}
+        for a in area_ids:
+            self.add(a)
+            
+    def add(self, area_id):
+        """Returns the index of `area_id`, registering it if needed"""
+        if area_id not in self.index:
+            self.index[area_id] = len(self.ids)
+            self.ids.append(area_id)
+            if "garage" in area_id:
+                self.edges.append(area_id.split("_")[1])
+            else:
+                self.edges.append(area_id.split("pa")[-1])
+        return self.index[area_id]
+    
+    
 ############################################
 # Buyer implementation:
+class BuyerStates:
+    """Live number of buyers in each state, updated by the buyers' state
+       transitions instead of rescanning the buyers."""
+    def __init__(self, buyers):
+        self.counts = {"overbid": 0, "winning": 0, "won": 0, "out_of_budget": 0}
+        for b in buyers:
+            self.counts[b.state] += 1
+            b.states = self
+            
+    def move(self, old_state, new_state):
+        self.counts[old_state] -= 1
+        self.counts[new_state] += 1
+        
+    def terminated(self):
+        return self.counts["winning"] + self.counts["out_of_budget"]
+    
+    
 class Buyer:
-    def __init__(self, buyer_id, distances, pv=1000, beta=0.5, pvmax=1000):
+    """A buyer keeps its costs lazily: it is only informed about price changes
+       of the auctions in its preferred set (see `Auction.watchers`), the other
+       prices are read from the auctions when they reach the top of the heap.
+       As prices only increase, this gives the same preferences as informing
+       every buyer about every price change.
+       Auctions are referred to by their position `k` in the buyer's own list
+       (returned by `add_auction`)."""
+    __slots__ = ("id", "index", "state", "states", "pv", "beta", "pvmax", "distances",
+                 "distance_norm", "_auctions", "_areas", "_distance_costs", "_costs", "_heap", "_preferred",
+                 "n_inform", "n_costs")
+    
+    def __init__(self, buyer_id, distances, pv=1000, beta=0.5, pvmax=1000, index=None):
         self.id = buyer_id
+        self.index = index #position in the market
         self.state = "overbid"
+        self.states = None #BuyerStates of the running auction
         self.pv = pv
         self.beta = beta
         self.pvmax = pvmax
         self.distances = distances
-        self.prices = {}
+        self.distance_norm = None #default: max distance among the buyer's auctions
+        #cost cache (built at the first query):
+        self._auctions = []
+        self._areas = []
+        self._distance_costs = None
+        self._costs = None
+        self._heap = []
+        self._preferred = None
+        #instrumentation:
+        self.n_inform = 0
+        self.n_costs = 0
         
-    def inform_price(self, auction_id, price):
-        self.prices[auction_id] = price if price <= self.pv else np.inf
-        if np.all(np.array(self.prices) == np.inf):
-            self.state = "out_of_budget"
+    def _set_state(self, state):
+        if self.states is not None:
+            self.states.move(self.state, state)
+        self.state = state
+        
+    def add_auction(self, auction):
+        """Registers an auction and returns its index for this buyer"""
+        self._auctions.append(auction)
+        self._areas.append(auction.area)
+        self._distance_costs = None #normalization has changed
+        return len(self._auctions)-1
+        
+    def _cost(self, k):
+        price = self._auctions[k].price
+        if price > self.pv:
+            return np.inf
+        return self.beta*price/self.pvmax + self._distance_costs[k]
+        
+    def _build_cache(self):
+        areas = self._auctions[0].areas
+        area_distances = np.array([self.distances[e] for e in areas.edges])
+        distances = area_distances[np.array(self._areas, dtype=int)]
+        norm = self.distance_norm if self.distance_norm is not None else np.max(distances)
+        if norm == 0:
+            #all auctions at the buyer's position: no distance cost
+            self._distance_costs = np.zeros(len(distances))
+        else:
+            self._distance_costs = (1-self.beta)*distances/norm
+        self._costs = [self._cost(k) for k in range(len(self._auctions))]
+        self._heap = [(c, k) for k, c in enumerate(self._costs)]
+        heapq.heapify(self._heap)
+        self._preferred = None
+        
+    def _pop_best(self):
+        """Pops the cheapest heap entry that is up to date with the auctions"""
+        while True:
+            c, k = heapq.heappop(self._heap)
+            if c != self._costs[k]:
+                continue #outdated duplicate
+            cost = self._cost(k)
+            if cost == c:
+                return c, k
+            self._costs[k] = cost
+            heapq.heappush(self._heap, (cost, k))
+            
+    def _update_preferred(self):
+        """Collects the auctions with minimal cost and subscribes to them"""
+        self.n_costs += 1
+        best, k = self._pop_best()
+        entries = [(best, k)]
+        while (len(self._heap) > 0) and (self._heap[0][0] <= best):
+            c, k = self._pop_best()
+            if c != best:
+                heapq.heappush(self._heap, (c, k))
+                break
+            entries.append((c, k))
+        for e in entries:
+            heapq.heappush(self._heap, e)
+        self._preferred = set()
+        if best != np.inf:
+            for c, k in entries:
+                self._preferred.add(k)
+                self._auctions[k].watchers[self] = k
+        
+    def inform_price(self, k, price):
+        self.n_inform += 1
+        if self._distance_costs is None:
+            return
+        cost = self._cost(k)
+        if cost != self._costs[k]:
+            self._costs[k] = cost
+            heapq.heappush(self._heap, (cost, k))
+        if (self._preferred is not None) and (k in self._preferred):
+            self._auctions[k].watchers.pop(self, None)
+            self._preferred.discard(k)
+            if len(self._preferred) == 0:
+                self._preferred = None
         
     def compute_costs(self):
-        prices, distances, id_list = [], [], []
-        for p in self.prices:
-            prices.append(self.prices[p])
-            pname = re.sub("_[0-9]*$", "", p)
-            if "garage" in pname:
-                edge = pname.split("_")[1]
-            else:
-                edge = pname.split("pa")[-1]
-            distances.append(self.distances[edge])
-            id_list.append(p)
-        prices = np.array(prices)
-        distances = np.array(distances)
-        cost = self.beta*prices/self.pvmax + (1-self.beta)*distances/np.max(distances)
-        return cost, id_list
+        self.n_costs += 1
+        if self._distance_costs is None:
+            self._build_cache()
+        costs = np.array([self._cost(k) for k in range(len(self._auctions))])
+        return costs, [a.id for a in self._auctions]
         
-    def ask_bid(self, auction_id, price):
+    def ask_bid(self, k, price):
         bids = False
-        pref_ids = []
-        if (self.state == "overbid") and (price <= self.pv):
-            costs, ids = self.compute_costs()
-            prefs = np.where(costs == costs.min())[0]
-            for p in prefs:
-                pref_ids.append(ids[p])
-            bids = auction_id in pref_ids
-        #if self.id == "carIn967:4":
-        #        print(bids, pref_ids, auction_id)
-        elif price > self.pv:
-            self.prices[auction_id] = np.inf
+        if self.state == "overbid":
+            if self._distance_costs is None:
+                self._build_cache()
+            if self._preferred is None:
+                self._update_preferred()
+            if len(self._preferred) == 0:
+                #every candidate is above pv, and prices only increase:
+                self._set_state("out_of_budget")
+            elif price <= self.pv:
+                bids = k in self._preferred
         if bids:
-            self.state = "winning"
+            self._set_state("winning")
         return bids
     
     def tell_overbid(self):
-        self.state = "overbid"
+        self._set_state("overbid")
         
     def tell_won(self):
-        self.state = "won"
+        self._set_state("won")
     
 #############################################
 # Auctioneer implementation:
 class Auction:
-    def __init__(self, id_, starting_price, epsilon=1.0):
+    """Auction of a single slot. The string `id_` is only used in the results;
+       the slot refers to its parking area by an index into `areas`."""
+    __slots__ = ("id", "index", "areas", "area", "price", "buyers", "_buyer_slots",
+                 "watchers", "epsilon", "winner", "n_bids")
+    
+    def __init__(self, id_, starting_price, epsilon=1.0, areas=None, index=None):
         self.id = id_
+        self.index = index #position in the market
+        self.areas = areas if areas is not None else Areas()
+        self.area = self.areas.add(re.sub("_[0-9]*$", "", id_))
         self.price = starting_price
         self.buyers = []
+        self._buyer_slots = [] #index of this auction for each buyer
+        self.watchers = {} #buyers having this auction in their preferred set
         self.epsilon = epsilon
         self.winner = None
+        self.n_bids = 0
         
     def add_buyer(self, buyer):
         self.buyers.append(buyer)
+        self._buyer_slots.append(buyer.add_auction(self))
         
     def _inform_buyers(self):
-        for b in self.buyers:
-            b.inform_price(self.id, self.price)
+        for b, k in list(self.watchers.items()):
+            b.inform_price(k, self.price)
+        
+    def _retire_buyers(self):
+        """Drops the buyers that ran out of budget from the iteration"""
+        active = [j for j, b in enumerate(self.buyers) if b.state != "out_of_budget"]
+        if len(active) != len(self.buyers):
+            self.buyers = [self.buyers[j] for j in active]
+            self._buyer_slots = [self._buyer_slots[j] for j in active]
         
     def auction_round(self):
         bid_received = False
-        for b in self.buyers:                
-            bids = b.ask_bid(self.id, self.price)
+        self._retire_buyers()
+        for b, k in zip(self.buyers, self._buyer_slots):
+            bids = b.ask_bid(k, self.price)
             if bids:
                 if self.winner is not None:
                     self.winner.tell_overbid()
                 self.winner = b
+                self.n_bids += 1
                 self.price += self.epsilon
                 self._inform_buyers()
                 bid_received = True
@@ -99,8 +250,64 @@ class Auction:
             winner_id = self.winner.id
         return {"winner": winner_id,
                 "price" : self.price-self.epsilon}
+
+
+class MultiUnitAuction(Auction):
+    """Auction of all the slots of a parking area at a single (uniform) price.
+       The price stays at the starting price while there are free slots. When
+       the area is full, a new bid overbids the longest-standing winner and
+       raises the price by epsilon, like taking the cheapest slot of the area
+       in the one-auction-per-slot setting."""
+    __slots__ = ("capacity", "winners", "clearing_price")
+    
+    def __init__(self, id_, starting_price, capacity, epsilon=1.0, areas=None, index=None):
+        super().__init__(id_, starting_price, epsilon, areas, index)
+        self.capacity = capacity
+        self.winners = []
+        self.clearing_price = starting_price
+
+    def auction_round(self):
+        bid_received = False
+        self._retire_buyers()
+        for b, k in zip(self.buyers, self._buyer_slots):
+            bids = b.ask_bid(k, self.price)
+            if bids:
+                if len(self.winners) == self.capacity:
+                    self.winners.pop(0).tell_overbid()
+                self.winners.append(b)
+                self.n_bids += 1
+                self.clearing_price = self.price
+                if len(self.winners) == self.capacity:
+                    self.price += self.epsilon
+                    self._inform_buyers()
+                bid_received = True
+        return bid_received
+
+    def terminate(self):
+        for w in self.winners:
+            w.tell_won()
+        return {"winners": [w.id for w in self.winners],
+                "capacity": self.capacity,
+                "price": self.clearing_price}
                 
                 
+def candidate_areas(area_distances, k_nearest=None, max_distance=None):
+    """Indices of the parking areas a buyer takes part in: the `k_nearest`
+       closest ones among those within `max_distance` (no limit if None).
+       -------------
+       parameters:
+           - area_distances: array of the distances of the buyer from the areas,
+           - k_nearest: number of areas to keep,
+           - max_distance: distance budget"""
+    candidates = np.arange(len(area_distances))
+    if max_distance is not None:
+        candidates = candidates[area_distances <= max_distance]
+    if (k_nearest is not None) and (k_nearest < len(candidates)):
+        nearest = np.argpartition(area_distances[candidates], k_nearest-1)[:k_nearest]
+        candidates = np.sort(candidates[nearest])
+    return candidates
+
+
 #############################################
 # Running auctions:
 
@@ -112,30 +319,160 @@ def check_terminable(buyers):
     return len(buyers) - non_terminated_buyers
     
     
-def run_auctions(auctions, buyers, r_max):
+def split_markets(auctions, buyers):
+    """Splits a market into independent sub-markets: the connected components
+       of the graph of buyers and the auctions they take part in.
+       Returns a list of (auctions, buyers) pairs, keeping the original order."""
+    parent = list(range(len(auctions)+len(buyers)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    for i, a in enumerate(auctions):
+        for b in a.buyers:
+            root_a, root_b = find(i), find(len(auctions)+b.index)
+            if root_a != root_b:
+                parent[root_b] = root_a
+                
+    markets = {}
+    for i, a in enumerate(auctions):
+        markets.setdefault(find(i), ([], []))[0].append(a)
+    for j, b in enumerate(buyers):
+        markets.setdefault(find(len(auctions)+j), ([], []))[1].append(b)
+    return list(markets.values())
+
+
+def _market_spec(auctions, buyers):
+    """Plain-data description of a fresh market, cheap to send to a worker
+       process (pickling the linked objects would recurse through the whole
+       buyer-auction graph)."""
+    buyer_index = {b.index: j for j, b in enumerate(buyers)}
+    buyer_spec = [(b.id, b.distances, b.pv, b.beta, b.pvmax, b.distance_norm) for b in buyers]
+    auction_spec = []
+    for a in auctions:
+        capacity = a.capacity if isinstance(a, MultiUnitAuction) else None
+        auction_spec.append((a.id, a.price, a.epsilon, capacity,
+                             [buyer_index[b.index] for b in a.buyers]))
+    return auction_spec, buyer_spec
+
+
+def _run_market_spec(auction_spec, buyer_spec, r_max, time_budget):
+    buyers = []
+    for j, (b_id, distances, pv, beta, pvmax, distance_norm) in enumerate(buyer_spec):
+        b = Buyer(b_id, distances, pv=pv, beta=beta, pvmax=pvmax, index=j)
+        b.distance_norm = distance_norm
+        buyers.append(b)
+    areas = Areas()
+    auctions = []
+    for i, (a_id, price, epsilon, capacity, buyer_idx) in enumerate(auction_spec):
+        if capacity is None:
+            a = Auction(a_id, price, epsilon, areas, index=i)
+        else:
+            a = MultiUnitAuction(a_id, price, capacity, epsilon, areas, index=i)
+        for j in buyer_idx:
+            a.add_buyer(buyers[j])
+        auctions.append(a)
+    for b in buyers:
+        if len(b._auctions) == 0:
+            b.state = "out_of_budget"
+    stats = {}
+    auction_results = run_auctions(auctions, buyers, r_max, stats=stats, time_budget=time_budget)
+    return auction_results, stats
+
+
+def run_auctions_parallel(auctions, buyers, r_max, pool, stats=None, time_budget=None,
+                          markets=None):
+    """Solves the independent sub-markets (see `split_markets`) of a freshly
+       initialized market on a process pool and merges their results.
+       The round and time budgets apply to each sub-market.
+       The buyer and auction objects are not updated. `markets` are the
+       sub-markets if they were already split."""
+    start = time.perf_counter()
+    if markets is None:
+        markets = split_markets(auctions, buyers)
+    specs = [_market_spec(a, b) for a, b in markets]
+    if time_budget is not None:
+        time_budget = max(0.0, time_budget - (time.perf_counter()-start))
+    specs = [spec + (r_max, time_budget) for spec in specs]
     auction_results = {}
-    rs = np.zeros(len(auctions))
+    total_stats = {"rounds": 0, "bids": 0, "inform_price": 0, "compute_costs": 0,
+                   "stopped": "converged"}
+    for market_results, market_stats in pool.starmap(_run_market_spec, specs):
+        auction_results.update(market_results)
+        total_stats["rounds"] = max(total_stats["rounds"], market_stats["rounds"])
+        for key in ["bids", "inform_price", "compute_costs"]:
+            total_stats[key] += market_stats[key]
+        if market_stats["stopped"] != "converged":
+            total_stats["stopped"] = market_stats["stopped"]
+    if stats is not None:
+        stats.update(total_stats)
+        stats["markets"] = len(markets)
+    return auction_results
+
+
+def run_auctions(auctions, buyers, r_max=None, stats=None, pool=None, time_budget=None):
+    """Runs the auctions until every buyer is winning or out of budget, or
+       until a budget runs out (anytime mode): after `r_max` passes over the
+       auctions, or `time_budget` seconds of wall-clock time. When stopped
+       early, the current winners get their slots and the other buyers none,
+       which is always a feasible assignment.
+       If a `stats` dict is given, it gets the counters of the run: passes
+       over the auctions ("rounds"), accepted bids ("bids"), price
+       notifications ("inform_price") and preferred-set evaluations of the
+       buyers ("compute_costs"), and why the run ended ("stopped":
+       "converged", "r_max" or "deadline"). If a multiprocessing `pool` is
+       given and the market consists of several independent sub-markets,
+       they are solved in parallel by `run_auctions_parallel`."""
+    if pool is not None:
+        markets = split_markets(auctions, buyers)
+        if len(markets) > 1:
+            return run_auctions_parallel(auctions, buyers, r_max, pool, stats=stats,
+                                         time_budget=time_budget, markets=markets)
+    deadline = None if time_budget is None else time.perf_counter()+time_budget
+    auction_results = {}
+    states = BuyerStates(buyers)
     
-    terminables = 0
+    terminables = states.terminated()
+    rounds = 0
+    stopped = "converged"
 
-    while (terminables != len(buyers)): # np.sum(rs<r_max) :
-        #print(f"auction round: {terminables}/{len(buyers)}")
+    while (terminables != len(buyers)) and (stopped == "converged"):
+        if (r_max is not None) and (rounds >= r_max):
+            stopped = "r_max"
+            break
+        rounds += 1
         i = 0
         while (len(buyers) != terminables) and (i<len(auctions)):
-            bid_received = auctions[i].auction_round()
-            if bid_received:
-                rs[i] = 0
-            else:
-                rs[i] += 1
-
-            terminables = check_terminable(buyers)
+            auctions[i].auction_round()
+            terminables = states.terminated()
             i += 1
+            if (deadline is not None) and (time.perf_counter() > deadline):
+                stopped = "deadline"
+                break
                 
     for a in auctions:
         auction_results[a.id] = a.terminate()  
+    if stats is not None:
+        stats["rounds"] = rounds
+        stats["bids"] = sum(a.n_bids for a in auctions)
+        stats["inform_price"] = sum(b.n_inform for b in buyers)
+        stats["compute_costs"] = sum(b.n_costs for b in buyers)
+        stats["stopped"] = stopped
     return auction_results
 
 
+def price_spread(auction_results):
+    """Summary of the prices of the sold slots in per-slot `auction_results`"""
+    prices = [auction_results[a]["price"] for a in auction_results
+              if auction_results[a]["winner"] != ""]
+    if len(prices) == 0:
+        return {"sold": 0, "price_min": None, "price_max": None, "price_std": None}
+    return {"sold": len(prices), "price_min": float(np.min(prices)),
+            "price_max": float(np.max(prices)), "price_std": float(np.std(prices))}
+
+
 def get_won_auctions(auction_results, buyers):
     won_auctions = {}
     for b in buyers:
@@ -144,7 +481,47 @@ def get_won_auctions(auction_results, buyers):
                 won_auctions[b.id] = a
     return won_auctions
 
-def init_auction_method(parking_capacities, vehicle_ids, starting_prices, parking_mtx, betas=None, bid_step = 0.05, max_price = 5)-> (list, list):
+def clearing_prices(auction_results, starting_prices):
+    """Clearing price of each parking area in per-slot `auction_results`:
+       the lowest price among its slots, i.e. the starting price if a slot
+       remained free, else the price of the cheapest sold slot."""
+    prices = {}
+    for a in auction_results:
+        area = re.sub("_[0-9]*$", "", a)
+        price = starting_prices[area]
+        if auction_results[a]["winner"] != "":
+            price = auction_results[a]["price"]
+        prices[area] = min(prices.get(area, np.inf), price)
+    return prices
+
+def warm_start_prices(starting_prices, previous_prices, decay):
+    """Starting prices of the next auction seeded from the clearing prices of
+       the previous one, decaying back toward the original starting prices.
+       -------------
+       parameters:
+           - starting_prices: dict of the original starting prices,
+           - previous_prices: dict of the previous (seeded or clearing) prices,
+           - decay: share of the difference that is removed (1: cold start)"""
+    prices = starting_prices.copy()
+    for a in previous_prices:
+        prices[a] = starting_prices[a] + (1-decay)*(previous_prices[a]-starting_prices[a])
+    return prices
+
+def expand_multi_unit_results(auction_results):
+    """Converts the results of multi-unit auctions to per-slot results
+       (`{f"{area}_{i}": {"winner", "price"}}`), as if each slot had been
+       auctioned separately. Free slots get an empty winner."""
+    slot_results = {}
+    for a in auction_results:
+        winners = auction_results[a]["winners"]
+        for i in range(auction_results[a]["capacity"]):
+            slot_results[f"{a}_{i}"] = {
+                "winner": winners[i] if i < len(winners) else "",
+                "price": auction_results[a]["price"]
+            }
+    return slot_results
+
+def init_auction_method(parking_capacities, vehicle_ids, starting_prices, parking_mtx, betas=None, bid_step = 0.05, max_price = 5, multi_unit = False, districts = None, k_nearest = None, max_distance = None)-> (list, list):
     """Initializes the participants of the auction method
        -------------
        parameters:
@@ -154,7 +531,16 @@ def init_auction_method(parking_capacities, vehicle_ids, starting_prices, parkin
            - parking_mtx: mtx of parking distances for each vehicle
            - betas: either a dict of vehicle_ids, betas, a float, or None. Default: 0.1
            - bid_step: amount of money by which current bids will be increased during auctions,
-           - max_price: maximum price that the buyers are willing to accept"""
+           - max_price: maximum price that the buyers are willing to accept,
+           - multi_unit: if True, each parking area is a single `MultiUnitAuction`
+                         instead of one auction per slot,
+           - districts: optional dict of parking areas to district keys. If given,
+                        buyers only take part in the auctions of the district of
+                        their closest parking area (independent sub-markets),
+           - k_nearest: if given, buyers only take part in the auctions of their
+                        k nearest parking areas,
+           - max_distance: if given, buyers only take part in the auctions of the
+                           parking areas within this distance"""
     
     auctions = []
     buyers = []
@@ -168,14 +554,43 @@ def init_auction_method(parking_capacities, vehicle_ids, starting_prices, parkin
         betas_ = betas
             
     for i, b_i in enumerate(vehicle_ids):
-        buyers.append(Buyer(b_i, parking_mtx[b_i], beta = betas_[b_i], pv=max_price, pvmax=max_price))
+        buyers.append(Buyer(b_i, parking_mtx[b_i], beta = betas_[b_i], pv=max_price, pvmax=max_price, index=i))
+    areas = Areas([a for a in parking_capacities if parking_capacities[a] > 0])
     for a in parking_capacities:
+        if multi_unit:
+            if parking_capacities[a] > 0:
+                auctions.append(MultiUnitAuction(a, starting_prices[a], parking_capacities[a], bid_step, areas))
+            continue
         for i in range(parking_capacities[a]):
-            auctions.append(Auction(f"{a}_{i}", starting_prices[a], bid_step))
+            auctions.append(Auction(f"{a}_{i}", starting_prices[a], bid_step, areas))
     random.shuffle(auctions)
-    for a in auctions:
+    for i, a in enumerate(auctions):
+        a.index = i
+    if (districts is None) and (k_nearest is None) and (max_distance is None):
+        for a in auctions:
+            for b in buyers:
+                a.add_buyer(b)
+    else:
+        #restricted markets, collecting the buyers of each parking area:
+        area_buyers = [[] for a in areas.ids]
         for b in buyers:
-            a.add_buyer(b)
-            b.inform_price(a.id, a.price)
+            if len(areas.ids) == 0:
+                continue
+            area_distances = np.array([b.distances[e] for e in areas.edges])
+            candidates = candidate_areas(area_distances, k_nearest, max_distance)
+            if districts is not None:
+                b_district = districts[areas.ids[np.argmin(area_distances)]]
+                candidates = [j for j in candidates if districts[areas.ids[j]] == b_district]
+            #same cost function as in the full market:
+            b.distance_norm = np.max(area_distances)
+            for j in candidates:
+                area_buyers[j].append(b)
+        for a in auctions:
+            for b in area_buyers[a.area]:
+                a.add_buyer(b)
+    #buyers without auctions (e.g. no free slots at all) cannot win anything:
+    for b in buyers:
+        if len(b._auctions) == 0:
+            b.state = "out_of_budget"
             
-    return auctions, buyers
\ No newline at end of file
+    return auctions, buyers
@@ -52,8 +52,15 @@ def read_movements(filename: str) -> list:
     return movements
 
 
-def get_distance_to_parkings(traci, vehicle_id: str, sumo_parkings_lane_id: list) -> np.array:
-    '''Collecting distances of parking lots for each vehicles'''
+def get_distance_to_parkings(traci, vehicle_id: str, sumo_parkings_lane_id: list, road_graph=None) -> np.array:
+    '''Collecting distances of parking lots for each vehicles. If a `road_graph`
+       (see `road_distances.read_road_graph`) is given, only the position of the
+       vehicle is queried, the distances are computed offline.'''
+    if road_graph is not None:
+        import road_distances
+        parking_edges = [p.split("_")[0] for p in sumo_parkings_lane_id]
+        return list(road_distances.road_distances(road_graph, [traci.vehicle.getRoadID(vehicle_id)],
+                                                  parking_edges)[0])
     distances = []
     for p in sumo_parkings_lane_id:
         distances.append(traci.simulation.getDistanceRoad(
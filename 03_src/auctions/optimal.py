@@ -0,0 +1,126 @@
+"""Exact solution of the parking market as a rectangular linear assignment.
+
+Used as a deterministic reference for the auctions: the buyer x slot costs of
+`array_auction` are solved with the Jonker-Volgenant algorithm of SciPy, and
+the assignment is supported by the minimal (Walrasian) prices per parking
+area."""
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+import array_auction
+
+INFEASIBLE = 1e9 #cost of slots above the private value of a buyer
+
+
+def _candidate_slots(slots, n_buyers):
+    """Selects at most `n_buyers` slots of each parking area (slots of an area
+       are identical, the others could never be assigned)."""
+    taken = np.zeros(len(slots.area_ids), dtype=int)
+    candidates = []
+    for s, a in enumerate(slots.area):
+        if taken[a] < n_buyers:
+            candidates.append(s)
+            taken[a] += 1
+    return np.array(candidates, dtype=int)
+
+
+def assignment_costs(slots, buyers, slot_idx=None):
+    """Cost of assigning a buyer to a slot in money units: the starting price of
+       the slot plus the distance part of the buyer's cost (see
+       `array_auction._money_costs`)."""
+    if slot_idx is None:
+        slot_idx = np.arange(len(slots))
+    reserve = slots.starting_price[slot_idx]
+    costs = reserve[None, :] + array_auction._money_costs(buyers)[:, slots.area[slot_idx]]
+    costs[reserve[None, :] > buyers.pv[:, None]] = np.inf
+    return costs
+
+
+def supporting_prices(slots, buyers, assigned_slots):
+    """Minimal prices per parking area at which no buyer prefers another area
+       to the one it is assigned to. Areas with free slots keep their
+       starting price; if there are unassigned buyers, full areas they could
+       afford are priced at their private value.
+       -------------
+       parameters:
+           - slots, buyers: the market,
+           - assigned_slots: slot index of each buyer (-1 if unassigned)"""
+    n_areas = len(slots.area_ids)
+    reserve = np.full(n_areas, np.inf)
+    np.minimum.at(reserve, slots.area, slots.starting_price)
+    capacity = np.bincount(slots.area, minlength=n_areas)
+
+    holders = np.flatnonzero(assigned_slots >= 0)
+    own_area = slots.area[assigned_slots[holders]]
+    full = np.bincount(own_area, minlength=n_areas) == capacity
+
+    lower_bound = reserve.copy()
+    for u in np.flatnonzero(assigned_slots < 0):
+        affordable = full & (reserve <= buyers.pv[u])
+        lower_bound[affordable] = np.maximum(lower_bound[affordable], buyers.pv[u])
+
+    distance_costs = array_auction._money_costs(buyers)[holders]
+    distance_costs[reserve[None, :] > buyers.pv[holders][:, None]] = np.inf
+    own_costs = distance_costs[np.arange(len(holders)), own_area]
+    prices = lower_bound.copy()
+    for i in range(n_areas+1):
+        envy = prices[own_area] + own_costs
+        bound = (envy[:, None] - distance_costs).max(axis=0, initial=-np.inf)
+        new_prices = np.where(full, np.maximum(lower_bound, bound), reserve)
+        if np.allclose(new_prices, prices):
+            break
+        prices = new_prices
+    return np.minimum(prices, np.maximum(reserve, buyers.pv.max(initial=0.0)))
+
+
+def run_optimal(slots, buyers, stats=None):
+    """Assigns the buyers to slots with minimal total cost (starting prices
+       plus distance costs), then prices the slots with `supporting_prices`.
+       Returns the same `{auction_id: {"winner", "price"}}` structure as the
+       auctions. `stats` (if given) gets zero counters, as nothing is
+       iterated."""
+    candidates = _candidate_slots(slots, len(buyers))
+    costs = assignment_costs(slots, buyers, candidates)
+    feasible = np.isfinite(costs)
+    costs[~feasible] = INFEASIBLE
+    rows, cols = linear_sum_assignment(costs)
+    keep = feasible[rows, cols]
+    rows, cols = rows[keep], cols[keep]
+
+    assigned_slots = np.full(len(buyers), -1, dtype=int)
+    assigned_slots[rows] = candidates[cols]
+    slots.winner = np.full(len(slots), -1, dtype=int)
+    slots.winner[candidates[cols]] = rows
+    buyers.state[rows] = array_auction.WINNING
+    area_prices = supporting_prices(slots, buyers, assigned_slots)
+    slots.price = area_prices[slots.area]
+    if stats is not None:
+        stats.update({"rounds": 0, "bids": 0, "inform_price": 0, "compute_costs": 0,
+                      "stopped": "converged"})
+
+    auction_results = {}
+    for s, slot_id in enumerate(slots.ids):
+        winner = slots.winner[s]
+        auction_results[slot_id] = {
+            "winner": buyers.ids[winner] if winner >= 0 else "",
+            "price": slots.price[s]
+        }
+    return auction_results
+
+
+def assignment_cost(auction_results, slots, buyers):
+    """Total cost (starting prices plus distance costs, in money units) of the
+       assignment in `auction_results` on the market `slots`, `buyers`. Lets
+       the results of the different solvers be compared to `run_optimal`."""
+    slot_index = {slot_id: s for s, slot_id in enumerate(slots.ids)}
+    buyer_index = {buyer_id: b for b, buyer_id in enumerate(buyers.ids)}
+    rows, cols = [], []
+    for a in auction_results:
+        if auction_results[a]["winner"] != "":
+            rows.append(buyer_index[auction_results[a]["winner"]])
+            cols.append(slot_index[a])
+    if len(rows) == 0:
+        return 0.0
+    costs = slots.starting_price[cols] + array_auction._money_costs(buyers)[rows, slots.area[cols]]
+    return float(np.sum(costs))
@@ -1,7 +1,4 @@
 #!/bin/bash
 
-seeds=(42 1812 9698 424 820 75 98 65535 16383 513)
-
-for s in ${seeds[@]}; do
-    python3 auction_measurement.py $s --name ideal$s &
-done
+#runs the sweep on all available cores, skipping finished runs (see experiments.py)
+python3 experiments.py --methods ideal "$@"
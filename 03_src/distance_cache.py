@@ -0,0 +1,103 @@
+"""On-disk cache of the parking-to-parking road distances.
+
+The matrix is computed once per network (keyed by a hash of the net and the
+parking area definitions), stored as a .npy array and memory-mapped
+read-only by the measurement processes, so the runs of a sweep share it
+instead of each making len(parking_edges)**2 TraCI calls."""
+
+import numpy as np
+
+import os
+import json
+import fcntl
+import hashlib
+from collections.abc import Mapping
+
+NET_FILE = "../01_simulation/02_scenario/grid.net.xml"
+PARKING_DEFS = "../01_simulation/02_scenario/parking_areas.add.xml"
+CACHE_DIR = "../02_data/distance_cache"
+
+
+class DistanceRow(Mapping):
+    """Read-only `{to_edge: distance}` view of a row of the matrix"""
+    def __init__(self, row, index):
+        self.row = row
+        self.index = index
+
+    def __getitem__(self, edge):
+        return float(self.row[self.index[edge]])
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+
+class DistanceMap(Mapping):
+    """Read-only view of a distance matrix with the dict-of-dicts interface of
+       `parking_distance_map`: `distance_map[from_edge][to_edge]`"""
+    def __init__(self, matrix, edges):
+        self.matrix = matrix
+        self.edges = list(edges)
+        self.index = {e: i for i, e in enumerate(self.edges)}
+
+    def __getitem__(self, edge):
+        return DistanceRow(self.matrix[self.index[edge]], self.index)
+
+    def __iter__(self):
+        return iter(self.edges)
+
+    def __len__(self):
+        return len(self.edges)
+
+
+def network_key(parking_edges, files=(NET_FILE, PARKING_DEFS), source=""):
+    """Hash of the network files, of the order of the parking edges and of
+       the name of the distance source"""
+    h = hashlib.sha256()
+    for path in files:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    h.update("\n".join(parking_edges).encode())
+    h.update(source.encode())
+    return h.hexdigest()[:16]
+
+
+def pairwise_matrix(compute_distance):
+    """Turns a function giving the distance of two edges into a function
+       computing the distance matrix of a list of edges"""
+    def compute_matrix(edges):
+        matrix = np.empty((len(edges), len(edges)))
+        for i, p_i in enumerate(edges):
+            for j, p_j in enumerate(edges):
+                matrix[i, j] = compute_distance(p_i, p_j)
+        return matrix
+    return compute_matrix
+
+
+def load_distance_map(parking_edges, compute_matrix, source, files=(NET_FILE, PARKING_DEFS),
+                      cache_dir=CACHE_DIR):
+    """Returns the parking distance map of `parking_edges`, memory-mapped from
+       the cache. On a cache miss the matrix is computed with
+       `compute_matrix(parking_edges)` by the first process only; the
+       others wait on a file lock and then map the stored array.
+       -------------
+       parameters:
+           - parking_edges: list of the parking edges,
+           - compute_matrix: function giving the distance matrix of a list of edges,
+           - source: name of the distance computation (part of the cache key),
+           - files: files that define the network (part of the cache key),
+           - cache_dir: directory of the cached matrices"""
+    os.makedirs(cache_dir, exist_ok=True)
+    key = network_key(parking_edges, files, source)
+    path = f"{cache_dir}/{key}.npy"
+    with open(f"{cache_dir}/{key}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not os.path.exists(path):
+            np.save(f"{path}.tmp.npy", np.asarray(compute_matrix(parking_edges), dtype=float))
+            os.replace(f"{path}.tmp.npy", path)
+            with open(f"{cache_dir}/{key}.json", "w") as f:
+                json.dump({"files": list(files), "source": source, "edges": parking_edges}, f)
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    return DistanceMap(np.load(path, mmap_mode="r"), parking_edges)
@@ -0,0 +1,186 @@
+"""Runs a sweep of measurements on the cores of the machine.
+
+A sweep (methods x mixes x penetrations x seeds) is expanded into jobs, one
+measurement script run each. The jobs sharing a scenario (same mix and demand
+generation) are run together on a pool of worker processes, after the
+scenario is generated. Every job writes its SUMO outputs into a private work
+directory. Jobs with finished results (run_info.json) are skipped. Progress
+and the runtime of each job are appended to a manifest (JSON lines).
+
+Replaces the shell loops, e.g. auctions_penetrations.sh:
+    python3 experiments.py --methods auction
+The "ideal" runs of auctions_ideal.sh (every vehicle in auctions, no beta
+mix) belong to no mix: they get a scenario of their own, and the auctions
+give every buyer the same beta (auction_measurement.DEFAULT_BETA)."""
+
+import argparse
+import os
+import sys
+import json
+import shutil
+import subprocess
+import time as timer
+from multiprocessing.pool import ThreadPool
+
+DATA_ROOT = "../02_data"
+WORK_ROOT = "../04_work"
+MANIFEST = "../02_data/experiments_manifest.jsonl"
+CONFIGURATIONS = "../01_simulation/02_scenario/configurations"
+
+METHODS = ["auction", "information", "baseline", "ideal"]
+MIXES = ["mix10", "mix25", "mix50"]
+PENETRATIONS = [2, 4, 6, 8, 10]
+SEEDS = [42, 1812, 9698, 424, 820, 75, 98, 65535, 16383, 513]
+
+
+def available_cores():
+    """Number of cores this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count()
+
+def job_name(method, mix, penetration, seed):
+    if method == "baseline":
+        return f"{mix}/auction0/{seed}"
+    if method == "ideal":
+        return f"ideal{seed}"
+    return f"{mix}/{method}{penetration}/{seed}"
+
+def generate_command(method, mix):
+    """Demand generation of the scenario of a job (as in the shell scripts)"""
+    command = [sys.executable, "./generate_demand.py", "probs.dst.xml"]
+    if method == "baseline":
+        command += ["--betaconf", f"{CONFIGURATIONS}/{mix}.json"]
+    return command
+
+def measurement_command(method, mix, penetration, seed, name, work_dir):
+    mix_config = f"{CONFIGURATIONS}/{mix}.json"
+    if method == "auction":
+        command = [sys.executable, "auction_measurement.py", str(seed), "--name", name,
+                   "--penetration", str(penetration), "--mix_config", mix_config]
+    elif method == "information":
+        command = [sys.executable, "information_measurement.py", str(seed), mix_config,
+                   str(penetration), "--name", name]
+    elif method == "baseline":
+        command = [sys.executable, "auction_measurement.py", str(seed), "--name", name,
+                   "--penetration", "0"]
+    elif method == "ideal":
+        command = [sys.executable, "auction_measurement.py", str(seed), "--name", name,
+                   "--penetration", str(penetration)]
+    else:
+        raise ValueError(f"unknown method: {method}")
+    return command + ["--work_dir", work_dir]
+
+def expand_sweep(methods, mixes, penetrations, seeds):
+    """Returns the jobs of a sweep grouped by scenario: a list of
+       (demand generation command, jobs) pairs. Each mix is its own
+       scenario, even where the generation command does not depend on it."""
+    groups = {}
+    for mix in mixes:
+        for method in methods:
+            if method == "ideal":
+                continue
+            pens = [0] if method == "baseline" else penetrations
+            for pen in pens:
+                for seed in seeds:
+                    name = job_name(method, mix, pen, seed)
+                    work_dir = f"{WORK_ROOT}/{name}"
+                    job = {"name": name, "method": method, "mix": mix, "penetration": pen,
+                           "seed": seed, "work_dir": work_dir,
+                           "command": measurement_command(method, mix, pen, seed, name, work_dir)}
+                    groups.setdefault((mix, tuple(generate_command(method, mix))), []).append(job)
+    sweep = [(list(generate), jobs) for (_, generate), jobs in groups.items()]
+    if "ideal" in methods:
+        jobs = []
+        for seed in seeds:
+            name = job_name("ideal", None, 10, seed)
+            work_dir = f"{WORK_ROOT}/{name}"
+            jobs.append({"name": name, "method": "ideal", "mix": None, "penetration": 10,
+                         "seed": seed, "work_dir": work_dir,
+                         "command": measurement_command("ideal", None, 10, seed, name, work_dir)})
+        sweep.append((generate_command("ideal", None), jobs))
+    return sweep
+
+def is_done(job):
+    return os.path.exists(f"{DATA_ROOT}/{job['name']}/run_info.json")
+
+def run_job(job):
+    """Runs one measurement; its output goes to job.log in its work directory
+       (kept if the job fails)"""
+    os.makedirs(job["work_dir"], exist_ok=True)
+    start = timer.perf_counter()
+    with open(f"{job['work_dir']}/job.log", "w") as log:
+        returncode = subprocess.call(job["command"], stdout=log, stderr=subprocess.STDOUT)
+    runtime = timer.perf_counter()-start
+    status = "done" if returncode == 0 and is_done(job) else "failed"
+    if status == "done":
+        shutil.rmtree(job["work_dir"], ignore_errors=True)
+    return job, status, returncode, runtime
+
+def write_manifest(manifest, job, status, returncode=None, runtime=None):
+    entry = {key: job[key] for key in ["name", "method", "mix", "penetration", "seed"]}
+    entry.update({"status": status, "returncode": returncode, "runtime": runtime,
+                  "finished": timer.strftime("%Y-%m-%d %H:%M:%S")})
+    if status == "failed":
+        entry["log"] = f"{job['work_dir']}/job.log"
+    manifest.write(json.dumps(entry)+"\n")
+    manifest.flush()
+
+def run_sweep(groups, processes, generate=True, manifest_file=MANIFEST):
+    """Runs the jobs of `expand_sweep` on `processes` workers. Returns the
+       number of failed jobs."""
+    n_jobs = sum(len(jobs) for _, jobs in groups)
+    n_finished, n_failed = 0, 0
+    with open(manifest_file, "a") as manifest:
+        for generate_cmd, jobs in groups:
+            todo = []
+            for job in jobs:
+                if is_done(job):
+                    n_finished += 1
+                    write_manifest(manifest, job, "skipped")
+                else:
+                    todo.append(job)
+            if len(todo) == 0:
+                continue
+            if generate:
+                #the scenario files are shared, no job may run meanwhile:
+                subprocess.check_call(generate_cmd)
+                subprocess.check_call(["./generate.sh"])
+            with ThreadPool(processes) as pool:
+                for job, status, returncode, runtime in pool.imap_unordered(run_job, todo):
+                    n_finished += 1
+                    n_failed += status == "failed"
+                    write_manifest(manifest, job, status, returncode, runtime)
+                    print(f"[{n_finished}/{n_jobs}] {job['name']}: {status} in {runtime:.0f} s")
+    return n_failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--methods", help="measurement methods", type=str, nargs="+",
+                        choices=METHODS, default=["auction"])
+    parser.add_argument("--mixes", help="beta mix configurations", type=str, nargs="+", default=MIXES)
+    parser.add_argument("--penetrations", help="penetration levels (not used by baseline)", type=int,
+                        nargs="+", default=PENETRATIONS)
+    parser.add_argument("--seeds", help="simulation seeds", type=int, nargs="+", default=SEEDS)
+    parser.add_argument("--processes", help="number of parallel jobs (default: available cores)",
+                        type=int, default=None)
+    parser.add_argument("--no_generate", help="use the current scenario files instead of generating them",
+                        action="store_true")
+    parser.add_argument("--manifest", help="progress and runtime of the jobs (JSON lines)", type=str,
+                        default=MANIFEST)
+    parser.add_argument("--dry_run", help="only list the jobs", action="store_true")
+    args = parser.parse_args()
+
+    groups = expand_sweep(args.methods, args.mixes, args.penetrations, args.seeds)
+    if args.dry_run:
+        for generate_cmd, jobs in groups:
+            print(" ".join(generate_cmd))
+            for job in jobs:
+                print("    " + ("(done) " if is_done(job) else "") + " ".join(job["command"]))
+        sys.exit(0)
+
+    processes = args.processes if args.processes is not None else available_cores()
+    n_failed = run_sweep(groups, processes, generate=not args.no_generate, manifest_file=args.manifest)
+    sys.exit(1 if n_failed > 0 else 0)
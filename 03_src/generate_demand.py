@@ -96,6 +96,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("output", type=str)
     parser.add_argument("--betaconfig", type=str)
+    parser.add_argument("--net", help="net file for road distances (default: grid distances)", type=str)
     args = parser.parse_args()
     
     #setup:
@@ -129,10 +130,15 @@ if __name__ == "__main__":
     prob_dist = prob_dist/np.sum(prob_dist)
     
     if args.betaconfig is not None:
-        distances = {}
-        for e1 in all_edges:
-            for e2 in all_edges:
-                distances[(e1,e2)] = get_distance(e1,e2)
+        if args.net is not None:
+            import road_distances #needs sumolib
+            distances = road_distances.distance_dict(road_distances.read_road_graph(args.net),
+                                                     all_edges)
+        else:
+            distances = {}
+            for e1 in all_edges:
+                for e2 in all_edges:
+                    distances[(e1,e2)] = get_distance(e1,e2)
                 
         prices = {}
         for p in all_edges:
@@ -0,0 +1,75 @@
+"""Recording of the parking occupancies during the simulation.
+
+The occupancies of all parking areas are kept in one preallocated
+(ticks x parking areas) array, the capacities in a vector. Per-area mean,
+variance and peak of the occupancy are updated online (Welford), so the
+summary can be written without the full series."""
+
+import numpy as np
+import pandas as pd
+
+INITIAL_TICKS = 1024
+
+
+class OccupancyRecorder:
+    """Occupancy series and online statistics of the parking areas
+       -------------
+       parameters:
+           - parking_areas: ids of the parking areas,
+           - capacities: capacity of each parking area (same order),
+           - keep_series: store the full series, not only the statistics"""
+    def __init__(self, parking_areas, capacities, keep_series=True):
+        self.parking_areas = list(parking_areas)
+        self.capacities = np.asarray(capacities, dtype=float)
+        self.keep_series = keep_series
+        n_areas = len(self.parking_areas)
+        self.times = np.zeros(INITIAL_TICKS if keep_series else 0)
+        self.occupancies = np.zeros((len(self.times), n_areas))
+        self.ticks = 0
+        self.mean = np.zeros(n_areas)
+        self._m2 = np.zeros(n_areas)
+        self.peak = np.zeros(n_areas)
+
+    def free_slots(self, counts):
+        """Free slots of each parking area with `counts` parked vehicles"""
+        return self.capacities - counts
+
+    def record(self, time, counts):
+        """Records the occupancies of one tick from the parked vehicle counts"""
+        occupancy = counts/self.capacities
+        if self.keep_series:
+            if self.ticks == len(self.times):
+                self.times = np.concatenate([self.times, np.zeros(len(self.times))])
+                self.occupancies = np.concatenate([self.occupancies, np.zeros_like(self.occupancies)])
+            self.times[self.ticks] = time
+            self.occupancies[self.ticks] = occupancy
+        self.ticks += 1
+        delta = occupancy - self.mean
+        self.mean += delta/self.ticks
+        self._m2 += delta*(occupancy - self.mean)
+        np.maximum(self.peak, occupancy, out=self.peak)
+
+    @property
+    def variance(self):
+        if self.ticks == 0:
+            return np.zeros_like(self._m2)
+        return self._m2/self.ticks
+
+    def series(self):
+        """Occupancy series in the long format of occupancy.csv"""
+        n_areas = len(self.parking_areas)
+        series = pd.DataFrame()
+        series["parking_id"] = np.tile(self.parking_areas, self.ticks)
+        series["time"] = np.repeat(self.times[:self.ticks], n_areas)
+        series["occupancy"] = self.occupancies[:self.ticks].ravel()
+        return series
+
+    def summary(self):
+        """Per-area statistics of the occupancy"""
+        summary = pd.DataFrame()
+        summary["parking_id"] = self.parking_areas
+        summary["samples"] = self.ticks
+        summary["mean"] = self.mean
+        summary["variance"] = self.variance
+        summary["peak"] = self.peak
+        return summary
@@ -0,0 +1,129 @@
+"""Columnar storage of the per-run results.
+
+The vehicle results, auction outcomes and occupancy series of a run are
+written as uncompressed Arrow IPC (Feather v2) files with fixed schemas, so
+the notebooks can memory-map them and read only the columns they need. If
+pyarrow is not installed, the results are written as before (JSON / CSV);
+the readers load either format."""
+
+import pandas as pd
+
+import os
+import json
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:
+    pa = None
+
+FORMATS = ["arrow", "json"]
+
+if pa is not None:
+    SCHEMAS = {
+        "veh_results": pa.schema([
+            ("vehicle", pa.string()),
+            ("original_position", pa.string()),
+            ("controlled", pa.bool_()),
+            ("original_distance", pa.float64()),
+            ("decision_latency", pa.float64()),
+            ("parking_distance", pa.float64()),
+            ("original_price", pa.float64()),
+            ("parking_price", pa.float64()),
+            ("paid_price", pa.float64()),
+            ("auction_price", pa.float64()),
+            ("occupied_reserved", pa.bool_())
+        ]),
+        "auction_results": pa.schema([
+            ("vehicle", pa.string()),
+            ("parking_edge", pa.string()),
+            ("auction_id", pa.string()),
+            ("price", pa.float64()),
+            ("distance", pa.float64()),
+            ("time", pa.float64())
+        ]),
+        "occupancy": pa.schema([
+            ("parking_id", pa.string()),
+            ("time", pa.float64()),
+            ("occupancy", pa.float64())
+        ])
+    }
+else:
+    SCHEMAS = {"veh_results": None, "auction_results": None, "occupancy": None}
+
+
+def available():
+    return pa is not None
+
+def _to_python(value):
+    #numpy scalars -> python values
+    return value.item() if hasattr(value, "item") else value
+
+def write_records(run_dir, kind, records, results_format="arrow"):
+    """Writes results keyed by vehicle id (veh_results or auction_results)
+       -------------
+       parameters:
+           - run_dir: output directory of the run,
+           - kind: name of the result table,
+           - records: dict of vehicle id -> dict of values,
+           - results_format: "arrow" or "json" (json if pyarrow is missing)"""
+    if results_format == "arrow" and available():
+        rows = []
+        for veh, record in records.items():
+            row = {key: _to_python(value) for key, value in record.items()}
+            row["vehicle"] = str(veh)
+            rows.append(row)
+        table = pa.Table.from_pylist(rows, schema=SCHEMAS[kind])
+        feather.write_feather(table, f"{run_dir}/{kind}.arrow", compression="uncompressed")
+    else:
+        with open(f"{run_dir}/{kind}.json", "w") as f:
+            json.dump(records, f)
+
+def write_occupancy(run_dir, series, results_format="arrow"):
+    """Writes the occupancy series (DataFrame of `OccupancyRecorder.series`)"""
+    if results_format == "arrow" and available():
+        table = pa.Table.from_pandas(series, schema=SCHEMAS["occupancy"], preserve_index=False)
+        feather.write_feather(table, f"{run_dir}/occupancy.arrow", compression="uncompressed")
+    else:
+        series.to_csv(f"{run_dir}/occupancy.csv", index=False)
+
+def read_records(run_dir, kind, columns=None):
+    """Reads veh_results or auction_results of a run as a DataFrame indexed
+       by vehicle id (as `pd.DataFrame.from_dict(..., orient="index")` of the
+       JSON files). Only `columns` are read from Arrow files, memory-mapped."""
+    path = f"{run_dir}/{kind}.arrow"
+    if os.path.exists(path):
+        if columns is not None:
+            columns = ["vehicle"] + [col for col in columns if col != "vehicle"]
+        data = feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+        return data.set_index("vehicle", drop=(kind == "veh_results")).rename_axis(None)
+    with open(f"{run_dir}/{kind}.json") as f:
+        data = pd.DataFrame.from_dict(json.load(f), orient="index")
+    if columns is not None:
+        data = data[[col for col in columns if col in data.columns]]
+    return data
+
+def read_occupancy(run_dir, columns=None):
+    """Reads the occupancy series of a run"""
+    path = f"{run_dir}/occupancy.arrow"
+    if os.path.exists(path):
+        return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+    return pd.read_csv(f"{run_dir}/occupancy.csv", usecols=columns)
+
+def write_frame(path, frame):
+    """Writes a DataFrame (default index) to path.arrow, or to path.pkl if
+       pyarrow is missing"""
+    if available():
+        feather.write_feather(pa.Table.from_pandas(frame, preserve_index=False),
+                              f"{path}.arrow", compression="uncompressed")
+    else:
+        frame.to_pickle(f"{path}.pkl")
+
+def read_frame(path, columns=None):
+    """Reads a DataFrame written by `write_frame`, None if there is none"""
+    if os.path.exists(f"{path}.arrow"):
+        return feather.read_table(f"{path}.arrow", columns=columns, memory_map=True).to_pandas()
+    if os.path.exists(f"{path}.pkl"):
+        frame = pd.read_pickle(f"{path}.pkl")
+        return frame if columns is None else frame[columns]
+    return None
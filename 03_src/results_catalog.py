@@ -0,0 +1,175 @@
+"""Catalog of the measurement results of the whole experiment tree.
+
+The runs of the data tree ({mix}/{method}{penetration}/{seed}, e.g.
+mix25/auction6/42) are consolidated into one table per kind of result
+(vehicles, auctions, occupancy, flows), keyed by mix, method, penetration and
+seed. The tables are stored under {data root}/catalog; on update, only the
+runs whose files changed since the last update are read again.
+
+Usage from the notebooks:
+    vehicles = results_catalog.load("vehicles")
+    results_catalog.mean_values(vehicles)"""
+
+import pandas as pd
+
+import argparse
+import os
+import re
+import json
+
+import result_store
+import sumo_outputs
+
+DATA_ROOT = "../02_data"
+CATALOG_DIR = "catalog"
+KEYS = ["mix", "method", "penetration", "seed"]
+TABLES = ["vehicles", "auctions", "occupancy", "flows"]
+MEASUREMENT_NAME = re.compile(r"^([a-z_]+?)(\d+)$") #e.g. auction6
+
+
+def find_runs(data_root=DATA_ROOT):
+    """Returns the run directories of the data tree keyed by
+       (mix, method, penetration, seed)"""
+    runs = {}
+    for mix in sorted(os.listdir(data_root)):
+        mix_dir = f"{data_root}/{mix}"
+        if mix == CATALOG_DIR or not os.path.isdir(mix_dir):
+            continue
+        for meas_name in sorted(os.listdir(mix_dir)):
+            match = MEASUREMENT_NAME.match(meas_name)
+            if match is None or not os.path.isdir(f"{mix_dir}/{meas_name}"):
+                continue
+            for seed in sorted(os.listdir(f"{mix_dir}/{meas_name}")):
+                run_dir = f"{mix_dir}/{meas_name}/{seed}"
+                if seed.isdigit() and os.path.isdir(run_dir):
+                    runs[(mix, match.group(1), int(match.group(2)), int(seed))] = run_dir
+    return runs
+
+def fingerprint(run_dir):
+    """Size and modification time of each file of a run (parse caches left out)"""
+    return {entry.name: [entry.stat().st_size, entry.stat().st_mtime_ns]
+            for entry in os.scandir(run_dir)
+            if entry.is_file() and not entry.name.endswith(sumo_outputs.CACHE_SUFFIX)}
+
+def _has(files, name):
+    return any(f"{name}.{ext}" in files for ext in ["arrow", "json", "csv"])
+
+def read_run(run_dir):
+    """Reads the results of one run as a dict of table name -> DataFrame.
+       Vehicle results are merged with the SUMO trip infos on the vehicle id
+       (as read_vehicle_data of the notebooks)."""
+    files = os.listdir(run_dir)
+    tables = {}
+    if _has(files, "veh_results"):
+        veh_data = result_store.read_records(run_dir, "veh_results")
+        veh_data.index = veh_data.index.astype(int)
+        if sumo_outputs.has_output(run_dir, sumo_outputs.TRIP_OUTPUT):
+            trip_df = sumo_outputs.trip_frame(run_dir)
+            trip_df["id"] = trip_df["id"].astype(int)
+            veh_data = pd.merge(left=trip_df, right=veh_data, left_on="id", right_index=True)
+        else:
+            veh_data = veh_data.rename_axis("id").reset_index()
+        tables["vehicles"] = veh_data
+    if _has(files, "auction_results"):
+        auction_data = result_store.read_records(run_dir, "auction_results")
+        auction_data["id"] = auction_data.index.astype(int)
+        tables["auctions"] = auction_data.drop(columns=["vehicle"]).reset_index(drop=True)
+    if _has(files, "occupancy"):
+        tables["occupancy"] = result_store.read_occupancy(run_dir)
+    if sumo_outputs.has_output(run_dir, sumo_outputs.DETECTOR_OUTPUT):
+        flow_df = sumo_outputs.detector_frame(run_dir)
+        tables["flows"] = flow_df.groupby("begin")["flow"].mean().reset_index()
+    return tables
+
+def update(data_root=DATA_ROOT):
+    """Brings the catalog up to date with the data tree: new and changed runs
+       are read, removed runs are dropped. Returns the number of runs read."""
+    catalog_dir = f"{data_root}/{CATALOG_DIR}"
+    os.makedirs(catalog_dir, exist_ok=True)
+    index_file = f"{catalog_dir}/index.json"
+    index = {}
+    if os.path.exists(index_file):
+        with open(index_file) as f:
+            index = json.load(f)
+
+    runs = find_runs(data_root)
+    current = {"/".join(map(str, key)): fingerprint(run_dir) for key, run_dir in runs.items()}
+    changed = [key for key in runs if index.get("/".join(map(str, key))) != current["/".join(map(str, key))]]
+    removed = [name for name in index if name not in current]
+    if len(changed) == 0 and len(removed) == 0:
+        return 0
+
+    new_parts = {table: [] for table in TABLES}
+    for key in changed:
+        for table, data in read_run(runs[key]).items():
+            new_parts[table].append(data.assign(**dict(zip(KEYS, key))))
+    stale = changed + [(mix, method, int(pen), int(seed)) for mix, method, pen, seed
+                       in (name.split("/") for name in removed)]
+
+    for table in TABLES:
+        parts = new_parts[table]
+        old = result_store.read_frame(f"{catalog_dir}/{table}")
+        if old is not None:
+            kept = ~pd.MultiIndex.from_frame(old[KEYS]).isin(stale)
+            parts = [old[kept]] + parts
+        if len(parts) > 0:
+            result_store.write_frame(f"{catalog_dir}/{table}", pd.concat(parts, ignore_index=True))
+
+    with open(index_file, "w") as f:
+        json.dump(current, f)
+    return len(changed)
+
+def load(table, columns=None, data_root=DATA_ROOT, refresh=True):
+    """Returns a table of the catalog indexed by (mix, method, penetration, seed)
+       -------------
+       parameters:
+           - table: "vehicles", "auctions", "occupancy" or "flows",
+           - columns: columns to read (memory-mapped if stored as Arrow),
+           - refresh: update the catalog from the data tree first"""
+    if refresh:
+        update(data_root)
+    if columns is not None:
+        columns = KEYS + [col for col in columns if col not in KEYS]
+    data = result_store.read_frame(f"{data_root}/{CATALOG_DIR}/{table}", columns)
+    if data is None:
+        raise FileNotFoundError(f"no {table} results in {data_root}")
+    return data.set_index(KEYS).sort_index()
+
+
+############################################
+# Metrics:
+def mean_values(vehicles, distance_column="parking_distance", by=("mix", "method", "penetration")):
+    """Mean values of the vehicle results of each measurement (get_mean_values
+       of the notebooks for every group at once)"""
+    by = list(by)
+    grouped = vehicles.groupby(level=by)
+    revenue = vehicles.groupby(level=by+["seed"])["paid_price"].sum().groupby(level=by).mean()
+    return pd.DataFrame({
+        "avg_paid_price": grouped["paid_price"].mean(),
+        "avg_prolonged_distance": grouped[distance_column].mean(),
+        "avg_total_parking_revenue": revenue,
+        "avg_n_reroutes": grouped["rerouteNo"].mean()
+    })
+
+def flow_matrix(flows, mix, method, penetration, intervals=slice(None)):
+    """Mean detector flow of each interval of one measurement as a
+       seeds x intervals array, seeds in ascending order (read_flow of the
+       notebooks)"""
+    flow = flows.loc[(mix, method, penetration)].set_index("begin", append=True)["flow"].unstack()
+    return flow.values[:, intervals]
+
+def mean_occupancy(occupancy, mix, method, penetration):
+    """Mean occupancy of each parking edge in one measurement"""
+    occup = occupancy.loc[(mix, method, penetration)]
+    mean = occup.groupby("parking_id")["occupancy"].mean()
+    mean.index = mean.index.str.replace("pa", "", n=1)
+    return mean
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_root", help="root of the measurement data", type=str, default=DATA_ROOT)
+    args = parser.parse_args()
+
+    n_read = update(args.data_root)
+    print(f"{n_read} runs read into {args.data_root}/{CATALOG_DIR}")
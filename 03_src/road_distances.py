@@ -0,0 +1,89 @@
+"""Road distances computed offline from the net file (no running SUMO needed).
+
+The directed edge graph of the network is read with sumolib, and distances
+are computed with a multi-source Dijkstra pass of SciPy. The distance between
+two edges follows `traci.simulation.getDistanceRoad(from_edge, 0, to_edge, 0,
+isDriving=True)`: the length of the from-edge, then of the edges and junction
+lanes on the shortest route, up to the start of the to-edge (0 for the same
+edge)."""
+
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+import os
+import sys
+
+if "SUMO_HOME" in os.environ: #locating the simulator
+    sys.path.append(os.environ["SUMO_HOME"]+"/tools")
+import sumolib
+
+
+class RoadGraph:
+    """Directed graph of the edges of a network: an arc leads from an edge to
+       each edge it is connected to, weighted by the length of the edge plus
+       the length of the junction lanes of the connection."""
+    def __init__(self, edge_ids, arcs):
+        self.edge_ids = edge_ids
+        self.index = {e: i for i, e in enumerate(edge_ids)}
+        self.arcs = arcs
+
+    def __len__(self):
+        return len(self.edge_ids)
+
+
+def junction_length(net, connection):
+    """Length of the internal lanes a connection leads through: the via lane
+       and the internal lanes following it (e.g. after an internal junction)"""
+    length = 0.0
+    via = connection.getViaLaneID()
+    while via != "":
+        lane = net.getLane(via)
+        length += lane.getLength()
+        outgoing = lane.getOutgoing()
+        via = outgoing[0].getViaLaneID() if len(outgoing) > 0 else ""
+    return length
+
+
+def read_road_graph(net_file, vclass="passenger"):
+    """Reads the edges of `net_file` usable by `vclass` into a `RoadGraph`"""
+    net = sumolib.net.readNet(net_file, withInternal=True)
+    edges = [e for e in net.getEdges(withInternal=False) if e.allows(vclass)]
+    index = {e.getID(): i for i, e in enumerate(edges)}
+    rows, cols, weights = [], [], []
+    for e in edges:
+        for to_edge, connections in e.getOutgoing().items():
+            if to_edge.getID() not in index:
+                continue
+            junction_lengths = [junction_length(net, c) for c in connections]
+            rows.append(index[e.getID()])
+            cols.append(index[to_edge.getID()])
+            weights.append(e.getLength() + min(junction_lengths, default=0.0))
+    arcs = csr_matrix((weights, (rows, cols)), shape=(len(edges), len(edges)))
+    return RoadGraph([e.getID() for e in edges], arcs)
+
+
+def road_distances(graph, from_edges, to_edges=None):
+    """Matrix of the driving distances from `from_edges` to `to_edges`
+       (default: to `from_edges`). Unreachable edges are at infinity."""
+    if to_edges is None:
+        to_edges = from_edges
+    sources = [graph.index[e] for e in from_edges]
+    distances = dijkstra(graph.arcs, directed=True, indices=sources)
+    return distances[:, [graph.index[e] for e in to_edges]]
+
+
+def distance_matrix_function(net_file, vclass="passenger"):
+    """Function computing the distance matrix of a list of edges from
+       `net_file` (for `distance_cache.load_distance_map`)"""
+    def compute_matrix(edges):
+        return road_distances(read_road_graph(net_file, vclass), edges)
+    return compute_matrix
+
+
+def distance_dict(graph, from_edges, to_edges=None):
+    """Road distances as a dict of (from_edge, to_edge) pairs"""
+    if to_edges is None:
+        to_edges = from_edges
+    matrix = road_distances(graph, from_edges, to_edges)
+    return {(e1, e2): float(matrix[i, j]) for i, e1 in enumerate(from_edges)
+                                   for j, e2 in enumerate(to_edges)}
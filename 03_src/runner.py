@@ -0,0 +1,389 @@
+"""Simulation step loop shared by the measurement scripts.
+
+`Runner` owns the SUMO run: it samples the parking occupancies, follows the
+departing and stopping vehicles through the subscriptions of
+`subscriptions.py`, keeps the reservations and writes the outputs. How the
+vehicles are assigned to parking areas is decided by a `Controller` plugged
+into the loop (auctions, information guidance, or no control as a baseline).
+Running this file directly gives the no-control baseline."""
+
+import numpy as np
+import pandas as pd
+
+import argparse
+import os
+import json
+import shutil
+import time as timer
+
+import distance_cache
+import occupancy
+import result_store
+import road_distances
+import subscriptions
+import sumo_outputs
+import sumo_backend
+
+SIM_ROOT = "../01_simulation/02_scenario/"
+SIMULATION = "../01_simulation/02_scenario/sim.sumocfg"
+SUMO_CMD = ["sumo", "-c", SIMULATION, "--no-step-log"]
+TIME_STEP = 15
+PARKING_DEFS = "../01_simulation/02_scenario/parking_areas.add.xml"
+PARKING_REROUTERS = "../01_simulation/02_scenario/parking_rerouters.add.xml"
+DETECTOR_DEFS = "../01_simulation/02_scenario/detectors.add.xml"
+STARTING_PRICE_DEF = "../02_data/starting_prices.json"
+
+
+def create_parking_mtx(veh_destinations, parking_distance_map, parking_edges):
+    answer_mtx = {}
+    for veh in veh_destinations:
+        new_row = {}
+        for p_edge in parking_edges:
+            new_row[p_edge] = parking_distance_map[veh_destinations[veh]][p_edge]
+        answer_mtx[veh] = new_row
+    return answer_mtx
+
+
+############################################
+# Controllers:
+class Controller:
+    """Interface of the parking controllers of `Runner`. This base class does
+       not control any vehicle (no-control baseline)."""
+    name = "baseline"
+    route_distances = False #record the route distance of the departing vehicles
+
+    def __init__(self):
+        self.queue = {} #vehicle -> time it was queued, oldest first
+
+    def enqueue(self, veh, time):
+        """Queues a vehicle for the next decision of the controller. Only the
+           vehicles the controller guides are queued: the batch size and the
+           decision latency count them."""
+        self.queue[veh] = time
+
+    def take_queue(self):
+        """Returns the queued vehicles and empties the queue"""
+        queue, self.queue = self.queue, {}
+        return queue
+
+    def on_departure(self, runner, veh):
+        """Called for every departing vehicle, after its data is recorded"""
+        pass
+
+    def assign(self, runner, time, free_parkings):
+        """Called when the `BatchScheduler` fires, with the free slots of the
+           parking areas (reservations deducted). Takes the queued vehicles
+           with `take_queue` and reroutes them with `runner.reroute`."""
+        pass
+
+    def on_stop(self, runner, veh, parking_edge):
+        """Called when a vehicle starts to park on `parking_edge`"""
+        pass
+
+    def finish(self, runner):
+        """Called after the simulation ended. Returns the extra outputs of the
+           controller as a dict of names and data. Result tables of
+           `result_store` (e.g. "auction_results") are written in the results
+           format, anything else as a JSON file of that name."""
+        return {}
+
+    def run_info(self):
+        """Configuration of the controller to be recorded with the results"""
+        return {}
+
+
+############################################
+# Scheduling:
+class BatchScheduler:
+    """Decides when the controller makes its decisions. Without a batch size
+       and a maximum wait, it fires every TIME_STEP seconds. Otherwise it
+       fires as soon as batch_size vehicles are queued or the oldest queued
+       vehicle has waited max_wait seconds, whichever comes first.
+       -------------
+       parameters:
+           - batch_size: number of queued vehicles that triggers a decision,
+           - max_wait: maximum time a vehicle waits in the queue (s). Default:
+                       TIME_STEP if batch_size is given"""
+    def __init__(self, batch_size=None, max_wait=None):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        if batch_size is not None and max_wait is None:
+            self.max_wait = TIME_STEP
+
+    def due(self, time, queue):
+        if self.batch_size is None and self.max_wait is None:
+            return time%TIME_STEP == 0
+        if len(queue) == 0:
+            return False
+        if self.batch_size is not None and len(queue) >= self.batch_size:
+            return True
+        oldest = next(iter(queue.values()))
+        return time-oldest >= self.max_wait
+
+
+############################################
+# Runner:
+class Runner:
+    """Runs the simulation with a controller.
+       -------------
+       parameters:
+           - traci: the SUMO backend module (see `sumo_backend`),
+           - seed: seed of the simulation,
+           - name: name of the simulation (output directory under ../02_data),
+           - net_distances: compute the parking distances offline from the net
+                            file (`road_distances`) instead of with TraCI,
+           - scheduler: `BatchScheduler` of the controller decisions. Default:
+                        every TIME_STEP seconds,
+           - occupancy_series: write the full occupancy series, not only the
+                               per-area summary,
+           - results_format: "arrow" (columnar files, see `result_store`) or "json",
+           - work_dir: private directory of the SUMO outputs of this run.
+                       Default: the scenario directory and the working
+                       directory, with the run name as prefix"""
+    def __init__(self, traci, seed, name, net_distances=False, scheduler=None,
+                 occupancy_series=True, results_format="arrow", work_dir=None):
+        self.traci = traci
+        self.seed = seed
+        self.name = name
+        self.net_distances = net_distances
+        self.scheduler = BatchScheduler() if scheduler is None else scheduler
+        self.results_format = results_format
+        if results_format == "arrow" and not result_store.available():
+            print("pyarrow is not available, writing the results as JSON")
+            self.results_format = "json"
+        self.output_dir = f"../02_data/{name}"
+        self.sim_name = name.split("/")[-1]
+        self.work_dir = work_dir
+        if work_dir is None:
+            self.detector_output = f"{SIM_ROOT}/{self.sim_name}{sumo_outputs.DETECTOR_OUTPUT}.gz"
+            self.trip_output = f"./{self.sim_name}{sumo_outputs.TRIP_OUTPUT}.gz"
+        else:
+            self.detector_output = f"{work_dir}/{sumo_outputs.DETECTOR_OUTPUT}.gz"
+            self.trip_output = f"{work_dir}/{sumo_outputs.TRIP_OUTPUT}.gz"
+
+        self.parking_df = pd.read_xml(PARKING_DEFS, xpath="parkingArea")
+        self.parking_df["id"] = self.parking_df["id"].astype(str)
+        self.parking_df = self.parking_df.set_index("id")
+        self.capacities = self.parking_df["roadsideCapacity"].to_dict()
+        self.parking_area_edges = {pa: lane.split("_")[0] for pa, lane
+                                   in self.parking_df["lane"].items()}
+        self.parking_edges = list(self.parking_area_edges.values())
+        with open(STARTING_PRICE_DEF) as f:
+            self.starting_prices = json.load(f)
+
+        self.vehicle_data = {}
+        self.controlled_vehicles = set()
+        self.reservations = {pa: 0 for pa in self.parking_df.index}
+        self.free_parkings = {}
+        self.lane_lengths = {}
+        self.other_distances = {} #distances of edges without parking areas
+        self.parking_areas = list(self.parking_df.index)
+        self.occupancy = occupancy.OccupancyRecorder(
+            self.parking_areas, [self.capacities[pa] for pa in self.parking_areas],
+            keep_series=occupancy_series)
+        self.decisions = []
+        self.time = 0
+        self.steps = 0
+        self.loop_time = 0.0
+
+    def sumo_cmd(self):
+        if self.work_dir is None:
+            return SUMO_CMD + ["--seed", self.seed, "--output-prefix", f"{self.sim_name}",
+                               "--tripinfo-output", f"{sumo_outputs.TRIP_OUTPUT}.gz"]
+        #the detectors write next to their definition file:
+        os.makedirs(self.work_dir, exist_ok=True)
+        shutil.copy(DETECTOR_DEFS, self.work_dir)
+        additionals = [PARKING_DEFS, PARKING_REROUTERS,
+                       f"{self.work_dir}/{os.path.basename(DETECTOR_DEFS)}"]
+        return SUMO_CMD + ["--seed", self.seed, "--additional-files", ",".join(additionals),
+                           "--tripinfo-output", self.trip_output]
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.traci.start(self.sumo_cmd())
+        traci = self.traci
+        if self.net_distances:
+            self.parking_distance_map = distance_cache.load_distance_map(
+                self.parking_edges, road_distances.distance_matrix_function(distance_cache.NET_FILE),
+                "net")
+        else:
+            self.parking_distance_map = distance_cache.load_distance_map(
+                self.parking_edges, distance_cache.pairwise_matrix(
+                    lambda p_i, p_j: traci.simulation.getDistanceRoad(p_i, 0, p_j, 0, True)),
+                "traci")
+        self.stops = subscriptions.planned_stops()
+        subscriptions.subscribe(traci)
+
+    def edge_distance(self, from_edge, to_edge):
+        """Road distance of two edges from the parking distance map (TraCI
+           only once for edges without parking areas)"""
+        if from_edge in self.parking_distance_map and to_edge in self.parking_distance_map:
+            return self.parking_distance_map[from_edge][to_edge]
+        if (from_edge, to_edge) not in self.other_distances:
+            self.other_distances[(from_edge, to_edge)] = self.traci.simulation.getDistanceRoad(
+                from_edge, 0, to_edge, 0, isDriving=True)
+        return self.other_distances[(from_edge, to_edge)]
+
+    def route_distance(self, route, depart_pos):
+        """Driving distance from `depart_pos` on the first edge of a route to
+           the end of its last edge"""
+        last_lane = f"{route[-1]}_0"
+        if last_lane not in self.lane_lengths:
+            self.lane_lengths[last_lane] = self.traci.lane.getLength(last_lane)
+        distance = self.lane_lengths[last_lane]
+        if len(route)>1:
+            distance -= depart_pos
+        for from_edge, to_edge in zip(route[:-1], route[1:]):
+            distance += self.edge_distance(from_edge, to_edge)
+        return distance
+
+    def reroute(self, veh, new_edge, reserve=False):
+        """Sends a vehicle to the parking area of `new_edge`, optionally
+           reserving a slot there. Returns False if SUMO rejects the new stop."""
+        self.controlled_vehicles.add(veh)
+        self.vehicle_data[veh]["controlled"] = True
+        #flag 65: parking @ a parking area
+        try:
+            next_stop = self.traci.vehicle.getStops(veh, 1)[0]
+            self.traci.vehicle.replaceStop(veh, 0, f"pa{new_edge}", flags=65,
+                                           duration=next_stop.duration)
+            if reserve:
+                self.reservations[f"pa{new_edge}"] += 1
+        except Exception as e:
+            print(e)
+            self.controlled_vehicles.remove(veh)
+            return False
+        return True
+
+    def _decide(self, state, time, controller):
+        reserved = np.array([self.reservations[pa] for pa in self.parking_areas])
+        free = np.maximum(0, self.occupancy.free_slots(state.vehicle_counts(self.parking_areas)) - reserved)
+        self.free_parkings = dict(zip(self.parking_areas, free.astype(int).tolist()))
+        for veh, queued in controller.queue.items():
+            if veh in self.vehicle_data:
+                self.vehicle_data[veh]["decision_latency"] = time-queued
+        batch = len(controller.queue)
+        start = timer.perf_counter()
+        controller.assign(self, time, self.free_parkings)
+        if batch > 0:
+            self.decisions.append({"time": time, "batch": batch,
+                                   "compute_time": timer.perf_counter()-start})
+
+    def _departures(self, state, controller):
+        if controller.route_distances:
+            state.read_routes([dpv for dpv in state.departed if dpv in self.stops])
+        for dpv in state.departed:
+            if dpv in self.stops: #not through vehicle
+                self.vehicle_data[dpv] = {
+                    "original_position": self.stops[dpv].split("pa")[-1],
+                    "controlled": False
+                }
+                if controller.route_distances:
+                    self.vehicle_data[dpv]["original_distance"] = self.route_distance(*state.routes[dpv])
+            controller.on_departure(self, dpv)
+
+    def _stops(self, state, controller):
+        for spv, parking_edge in state.stopping_edges().items():
+            data = self.vehicle_data[spv]
+            data["parking_distance"] = self.parking_distance_map[data["original_position"]][parking_edge]
+            data["original_price"] = self.starting_prices[data["original_position"]]
+            data["parking_price"] = self.starting_prices[parking_edge]
+            data["paid_price"] = self.starting_prices[parking_edge] #controllers may override it
+            controller.on_stop(self, spv, parking_edge)
+
+    def run(self, controller):
+        """Runs the simulation to its end with `controller`"""
+        self.start()
+        state = subscriptions.StepState(self.traci)
+        loop_start = timer.perf_counter()
+
+        #Main simulation loop:
+        while state.min_expected>0:
+            time = self.time = state.time
+            #with lower frequency:
+            if time%TIME_STEP == 0:
+                self.occupancy.record(time, state.vehicle_counts(self.parking_areas))
+            if self.scheduler.due(time, controller.queue):
+                self._decide(state, time, controller)
+            self._departures(state, controller)
+            self._stops(state, controller)
+
+            self.traci.simulation.step()
+            self.steps += 1
+            state = subscriptions.StepState(self.traci)
+
+        self.loop_time = timer.perf_counter()-loop_start
+        print(f"{self.steps} steps in {self.loop_time:.1f} s ({self.steps/self.loop_time:.1f} steps/s)")
+        self.traci.close()
+        self.write_results(controller, controller.finish(self))
+
+    def write_results(self, controller, controller_outputs):
+        run_info = {"seed": self.seed, "controller": controller.name,
+                    "backend": self.traci.__name__, "steps": self.steps,
+                    "loop_time": self.loop_time,
+                    "batch_size": self.scheduler.batch_size,
+                    "max_wait": self.scheduler.max_wait,
+                    "results_format": self.results_format,
+                    "decisions": self.decisions}
+        run_info.update(controller.run_info())
+
+        try:
+            shutil.move(self.detector_output, f"{self.output_dir}/{sumo_outputs.DETECTOR_OUTPUT}.gz")
+            shutil.move(self.trip_output, f"{self.output_dir}/{sumo_outputs.TRIP_OUTPUT}.gz")
+
+            result_store.write_records(self.output_dir, "veh_results", self.vehicle_data,
+                                       self.results_format)
+            for name in controller_outputs:
+                if name in result_store.SCHEMAS:
+                    result_store.write_records(self.output_dir, name, controller_outputs[name],
+                                               self.results_format)
+                else:
+                    with open(f"{self.output_dir}/{name}", "w") as f:
+                        json.dump(controller_outputs[name], f)
+
+            if self.occupancy.keep_series:
+                result_store.write_occupancy(self.output_dir, self.occupancy.series(),
+                                             self.results_format)
+            self.occupancy.summary().to_csv(f"{self.output_dir}/occupancy_summary.csv", index=False)
+            #written last: marks the run as complete
+            with open(f"{self.output_dir}/run_info.json", "w") as f:
+                json.dump(run_info, f)
+        except Exception as e:
+            print(e)
+
+
+def add_runner_arguments(parser):
+    """Adds the command line options of `Runner` to an argument parser"""
+    parser.add_argument("--net_distances", help="compute the parking distances offline from the net file instead of with TraCI",
+                        action="store_true")
+    parser.add_argument("--backend", help=f"SUMO control backend (default: ${sumo_backend.BACKEND_VARIABLE} or traci)",
+                        type=str, choices=sumo_backend.BACKENDS, default=None)
+    parser.add_argument("--batch_size", help="decide as soon as this many vehicles are queued (instead of every TIME_STEP seconds)",
+                        type=int, default=None)
+    parser.add_argument("--max_wait", help="decide at the latest when the oldest queued vehicle has waited this many seconds",
+                        type=float, default=None)
+    parser.add_argument("--occupancy_summary_only", help="only write the per-area occupancy statistics, not the full occupancy series",
+                        action="store_true")
+    parser.add_argument("--results_format", help="format of the vehicle, auction and occupancy results (arrow needs pyarrow)",
+                        type=str, choices=result_store.FORMATS, default="arrow")
+    parser.add_argument("--work_dir", help="private directory for the SUMO outputs of this run (for parallel runs)",
+                        type=str, default=None)
+
+
+def make_runner(traci, args):
+    """Creates a `Runner` from the command line options of `add_runner_arguments`"""
+    return Runner(traci, args.seed, args.name, args.net_distances,
+                  BatchScheduler(args.batch_size, args.max_wait),
+                  occupancy_series=not args.occupancy_summary_only,
+                  results_format=args.results_format, work_dir=args.work_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("seed", help="seed", type=str)
+    parser.add_argument("--name", help="name of the simulation", type=str)
+    add_runner_arguments(parser)
+    args = parser.parse_args()
+
+    traci, backend = sumo_backend.select_backend(args.backend)
+    make_runner(traci, args).run(Controller())
@@ -0,0 +1,77 @@
+"""Bulk per-step reads of the simulation state with TraCI subscriptions.
+
+The measurement loops subscribe once to the simulation variables; their
+values then arrive with the response of every simulation step. The route of a
+departing vehicle and the edge of a stopping vehicle are read with a
+subscription for that step only. The parking occupancies are only read in the
+steps that need them (every TIME_STEP and at the decisions): subscribing to
+the parking areas would parse their vehicles in every step, which costs more
+than the calls it saves."""
+
+import numpy as np
+
+import xml.etree.ElementTree as ET
+
+ROUTE_FILE = "../01_simulation/02_scenario/trips.rou.xml"
+
+
+def planned_stops(route_file=ROUTE_FILE):
+    """Returns the first stopping place of each vehicle of the route file
+       (vehicles without stops are left out)"""
+    stops = {}
+    for _, elem in ET.iterparse(route_file):
+        if elem.tag == "vehicle":
+            stop = elem.find("stop")
+            if stop is not None:
+                stops[elem.get("id")] = stop.get("parkingArea", stop.get("busStop"))
+            elem.clear()
+    return stops
+
+
+def subscribe(traci):
+    """Subscribes to the step variables of the simulation"""
+    tc = traci.constants
+    traci.simulation.subscribe([tc.VAR_TIME, tc.VAR_MIN_EXPECTED_VEHICLES,
+                                tc.VAR_DEPARTED_VEHICLES_IDS,
+                                tc.VAR_STOP_STARTING_VEHICLES_IDS])
+
+
+class StepState:
+    """Subscription results of the current simulation step"""
+    def __init__(self, traci):
+        tc = traci.constants
+        self.traci = traci
+        simulation = traci.simulation.getSubscriptionResults()
+        self.time = simulation[tc.VAR_TIME]
+        self.min_expected = simulation[tc.VAR_MIN_EXPECTED_VEHICLES]
+        self.departed = simulation[tc.VAR_DEPARTED_VEHICLES_IDS]
+        self.stopping = simulation[tc.VAR_STOP_STARTING_VEHICLES_IDS]
+        self.routes = {}
+        self._counts = None
+
+    def _read_vehicles(self, vehicles, variables):
+        #the subscriptions answer at once and expire after this step:
+        for veh in vehicles:
+            self.traci.vehicle.subscribe(veh, variables, self.time, self.time)
+        return {veh: self.traci.vehicle.getSubscriptionResults(veh) for veh in vehicles}
+
+    def read_routes(self, vehicles):
+        """Reads the route edges and the lane position of departing `vehicles`
+           into `routes` (vehicle -> (edges, position))"""
+        tc = self.traci.constants
+        for veh, values in self._read_vehicles(vehicles, [tc.VAR_EDGES, tc.VAR_LANEPOSITION]).items():
+            self.routes[veh] = (values[tc.VAR_EDGES], values[tc.VAR_LANEPOSITION])
+
+    def stopping_edges(self):
+        """Edge of each vehicle that started to stop in this step"""
+        tc = self.traci.constants
+        return {veh: values[tc.VAR_ROAD_ID] for veh, values
+                in self._read_vehicles(self.stopping, [tc.VAR_ROAD_ID]).items()}
+
+    def vehicle_counts(self, parking_areas):
+        """Number of parked vehicles of each parking area as an array (read
+           once per step)"""
+        if self._counts is None:
+            self._counts = np.fromiter((self.traci.parkingarea.getVehicleCount(pa) for pa in parking_areas),
+                                       dtype=float, count=len(parking_areas))
+        return self._counts
@@ -0,0 +1,29 @@
+"""Selection of the SUMO control backend of the measurement scripts.
+
+"traci" talks to a separate sumo process over a socket, "libsumo" runs the
+simulation in-process with the same API. The backend is chosen on the command
+line or with the SUMO_BACKEND environment variable; if libsumo cannot be
+imported, traci is used instead."""
+
+import os
+import importlib
+
+BACKENDS = ["traci", "libsumo"]
+BACKEND_VARIABLE = "SUMO_BACKEND"
+
+
+def select_backend(name=None):
+    """Returns the backend module and its name
+       -------------
+       parameters:
+           - name: "traci" or "libsumo". Default: $SUMO_BACKEND, else "traci\""""
+    if name is None:
+        name = os.environ.get(BACKEND_VARIABLE, "traci")
+    if name not in BACKENDS:
+        raise ValueError(f"unknown SUMO backend: {name}")
+    if name == "libsumo":
+        try:
+            return importlib.import_module("libsumo"), "libsumo"
+        except ImportError as e:
+            print(f"libsumo is not available ({e}), falling back to traci")
+    return importlib.import_module("traci"), "traci"
@@ -0,0 +1,88 @@
+"""Fast reading of the SUMO outputs of a run.
+
+The detector and tripinfo outputs are written gzip-compressed. They are read
+line by line with regular expressions (as sumolib.xml.parse_fast; elements
+are expected not to span lines) straight into NumPy arrays, one per
+attribute. The arrays are cached next to the source file (<file>.npz) and
+reused while the source is unchanged."""
+
+import numpy as np
+import pandas as pd
+
+import os
+import re
+import gzip
+
+DETECTOR_OUTPUT = "detector_data.out.xml"
+TRIP_OUTPUT = "vehicle_trips.xml"
+CACHE_SUFFIX = ".npz"
+
+ATTRIBUTE = re.compile(r'(\w+)="([^"]*)"')
+STRING_ATTRIBUTES = ["id", "vType", "departLane", "arrivalLane", "devices", "vaporized"]
+
+
+def find_output(run_dir, name):
+    """Path of an output of a run, compressed (name.gz) or not"""
+    if os.path.exists(f"{run_dir}/{name}.gz"):
+        return f"{run_dir}/{name}.gz"
+    return f"{run_dir}/{name}"
+
+def has_output(run_dir, name):
+    return os.path.exists(find_output(run_dir, name))
+
+def _open(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt")
+    return open(path)
+
+def _to_array(name, values):
+    if name not in STRING_ATTRIBUTES:
+        try:
+            return np.array([value if value != "" else "nan" for value in values], dtype=float)
+        except ValueError:
+            pass
+    return np.array(values, dtype=str)
+
+def parse_elements(path, tag):
+    """Reads the attributes of the `tag` elements of a SUMO output file
+       -------------
+       parameters:
+           - path: the output file (.xml or .xml.gz),
+           - tag: element name (e.g. "interval", "tripinfo")
+       returns: dict of attribute name -> array (numeric attributes as float)"""
+    start = f"<{tag} "
+    element = re.compile(rf"<{tag}\s([^>]*)>")
+    rows = []
+    with _open(path) as f:
+        for line in f:
+            if start in line:
+                for attributes in element.findall(line):
+                    rows.append(dict(ATTRIBUTE.findall(attributes)))
+    names = {}
+    for row in rows:
+        names.update(dict.fromkeys(row))
+    return {name: _to_array(name, [row.get(name, "") for row in rows]) for name in names}
+
+def read_elements(path, tag):
+    """`parse_elements` with the results cached next to the source file"""
+    cache_file = path + CACHE_SUFFIX
+    stat = os.stat(path)
+    source = np.array([stat.st_size, stat.st_mtime_ns])
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as cached:
+            if np.array_equal(cached["_source"], source) and str(cached["_tag"]) == tag:
+                return {name: cached[name] for name in cached.files if not name.startswith("_")}
+    arrays = parse_elements(path, tag)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "wb") as f:
+        np.savez(f, _source=source, _tag=np.array(tag), **arrays)
+    os.replace(tmp_file, cache_file)
+    return arrays
+
+def detector_frame(run_dir):
+    """Induction loop intervals of a run (as pd.read_xml(..., xpath="interval"))"""
+    return pd.DataFrame(read_elements(find_output(run_dir, DETECTOR_OUTPUT), "interval"))
+
+def trip_frame(run_dir):
+    """Trip infos of a run (as pd.read_xml(..., xpath="tripinfo"))"""
+    return pd.DataFrame(read_elements(find_output(run_dir, TRIP_OUTPUT), "tripinfo"))